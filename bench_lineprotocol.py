@@ -0,0 +1,86 @@
+# MIT License
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Micro-benchmark comparing cost per point of the previous dict + influxdb client serialization with the
+# line protocol encoder. Run with: python3 bench_lineprotocol.py
+
+import datetime
+import timeit
+
+from influxdb.line_protocol import make_lines
+
+import lineprotocol
+
+NUMBER = 20000
+
+_targetT = 18.0
+_chamberT = 16.4375
+_beerT = 18.1875
+_tiltT = 18.3
+_sg = 1.0123
+
+# how points were built and serialized before: string fields, datetime and client side conversion
+def previous():
+    _fields = {}
+    _fields["targetTemp"] = str(round(float(_targetT),1))
+    _fields["chamberTemp"] = str(round(float(_chamberT),1))
+    _fields["beerTemp"] = str(round(float(_beerT),1))
+    _fields["tiltTemp"] = str(round(float(_tiltT),1))
+    _fields["gravity"] = "{:5.3f}".format(round(float(_sg),3))
+    _fields["heating"] = False
+    _fields["cooling"] = True
+    _fields["tiltControlled"] = False
+
+    _postdata = {
+        "points": [
+            {
+                "measurement": "fermonitor",
+                "time": datetime.datetime.utcnow(),
+                "fields": _fields
+            }
+        ]
+    }
+    return make_lines(_postdata).encode('utf-8')
+
+encoder = lineprotocol.PointEncoder("fermonitor")
+
+def current():
+    return encoder.encode({
+        "targetTemp": round(_targetT,1),
+        "chamberTemp": round(_chamberT,1),
+        "beerTemp": round(_beerT,1),
+        "tiltTemp": round(_tiltT,1),
+        "gravity": round(_sg,3),
+        "heating": False,
+        "cooling": True,
+        "tiltControlled": False})
+
+def main():
+    print("previous: " + previous().decode('utf8').strip())
+    print("current:  " + current().decode('utf8'))
+
+    for name, func in (("previous", previous), ("current", current)):
+        best = min(timeit.repeat(func, number=NUMBER, repeat=5))
+        print("{:8s} {:8.2f} us/point".format(name, best/NUMBER*1000000))
+
+if __name__ == "__main__": #dont run this as a module
+    main()
@@ -0,0 +1,85 @@
+# MIT License
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Load generator measuring requests per second the web interface sustains. Start fermonitor first, then run with:
+# python3 bench_web.py [url] [clients] [seconds]
+# Requests use keep-alive connections; compare Server = DEVELOPMENT and WAITRESS in [Web] of fermonitor.ini.
+
+import sys
+import time
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+URL = "http://localhost:5000/"
+CLIENTS = 8
+SECONDS = 10
+
+def client(_url, _deadline, _results):
+    parts = urlsplit(_url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+    count = 0
+    errors = 0
+    latencies = []
+    while time.monotonic() < _deadline:
+        start = time.monotonic()
+        try:
+            conn.request("GET", parts.path or "/", headers={"Accept-Encoding": "gzip"})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+        count += 1
+        latencies.append(time.monotonic() - start)
+    conn.close()
+    _results.append((count, errors, latencies))
+
+def main():
+    url = sys.argv[1] if len(sys.argv) > 1 else URL
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else CLIENTS
+    seconds = int(sys.argv[3]) if len(sys.argv) > 3 else SECONDS
+
+    results = []
+    deadline = time.monotonic() + seconds
+    threads = [threading.Thread(target=client, args=(url, deadline, results)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    count = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    latencies = sorted(l for r in results for l in r[2])
+    if count == 0:
+        print("no requests completed")
+        return
+
+    print("{} clients, {} requests, {} errors".format(clients, count, errors))
+    print("{:8.1f} requests/s".format(count/seconds))
+    print("{:8.1f} ms median, {:.1f} ms 95th percentile".format(latencies[len(latencies)//2]*1000, latencies[int(len(latencies)*0.95)]*1000))
+
+if __name__ == "__main__": #dont run this as a module
+    main()
@@ -28,9 +28,12 @@ import time
 import os
 import threading
 import logging
-import configparser
+from collections import namedtuple
 from distutils.util import strtobool
 
+import configcache
+import statefile
+
 logger = logging.getLogger('FERMONITOR.BREWFATHER')
 logger.setLevel(logging.INFO)
 
@@ -51,6 +54,9 @@ class BrewFather (threading.Thread):
         self.interval = MINIMUM_INTERVAL    # interval in seconds for updating BrewFather; BrewFather rejects updates more often than 15min
         self.stopThread = True              # flag used for stopping the background thread that updates BrewFather
         self.bNewData = False
+        self.config = None
+        self.version = 0                    # incremented whenever next or last JSON changes
+        self.subscribers = []               # called whenever version changes
 
         # Data accepted by BrewFather; OK if some values are ""; not sure what happens if fields are missing.
         self.postdata = {
@@ -108,7 +114,10 @@ class BrewFather (threading.Thread):
 
         if _beer_temp != None or _aux_temp != None or _gravity != None:
             self.bNewData = True
-        self.jsondump = json.dumps(self.postdata).encode('utf8')
+        _jsondump = json.dumps(self.postdata).encode('utf8')
+        if _jsondump != self.jsondump:
+            self.jsondump = _jsondump
+            self._changed()
 
             
     def getNextJSON(self):
@@ -120,6 +129,41 @@ class BrewFather (threading.Thread):
     def getLastRequestTime(self):
         return self.lastUpdateTime
 
+    def getVersion(self):
+        return self.version
+
+    # callback is called without arguments whenever next or last JSON changes
+    def subscribe(self, _callback):
+        self.subscribers.append(_callback)
+
+    def _changed(self):
+        self.version += 1
+        for callback in list(self.subscribers):
+            try:
+                callback()
+            except Exception:
+                logger.exception("Subscriber failed handling change of BrewFather data")
+
+    # returns time and JSON of last update to be saved for a restart
+    def getCheckpoint(self):
+        _last = self.prevjsondump
+        return {
+            "lastUpdateTime": statefile.encodeTime(self.lastUpdateTime),
+            "lastJSON": _last.decode('utf8') if isinstance(_last, bytes) else _last}
+
+    # applies state saved by getCheckpoint() before a restart so BrewFather is not updated again before the interval
+    # expired
+    def restore(self, _data):
+        if not isinstance(_data, dict):
+            return
+
+        _time = statefile.decodeTime(_data.get("lastUpdateTime"))
+        if _time is not None and _time <= datetime.datetime.now():
+            self.lastUpdateTime = _time
+        if isinstance(_data.get("lastJSON"), str):
+            self.prevjsondump = _data["lastJSON"].encode('utf8')
+        self._changed()
+
     # method for connecting and updating BrewFather.app
     def _update(self):
         updateTime = self.lastUpdateTime + datetime.timedelta(seconds=self.interval)
@@ -136,90 +180,101 @@ class BrewFather (threading.Thread):
             try:
                 self.prevjsondump = self.jsondump
                 self.bNewData = False
+                self._changed()
                 
                 req = request.Request(self.sURL, data=self.prevjsondump, headers={'content-type': 'application/json'})
                 response = request.urlopen(req)
 
                 self.lastUpdateTime = datetime.datetime.now()
-                logger.debug("Update BrewFather JSON: " + str(self.getLastJSON()))
+                self._changed()
+                logger.debug("Update BrewFather JSON: %s", self.getLastJSON())
             except:
-                logger.error("Exception posting to Brewfather: "+str(self.getLastJSON()))
-        else:
-            logger.debug("No update - parameters:\nbUpdate = "+str(self.bUpdate)+"\nsUrl = "+self.sURL+"\npostdata.Name = "+self.postdata["name"] + \
-                "\npostdata.temp = "+self.postdata["temp"]+"\npostdata.gravity = "+self.postdata["gravity"] + "\npostdata.aux_temp = "+self.postdata["aux_temp"] + \
-                        "\nupdateTime = "+updateTime.strftime("%d.%m.%Y %H:%M:%S") + \
-                            "\nlastUpdateTime = "+self.lastUpdateTime.strftime("%d.%m.%Y %H:%M:%S") + \
-                               "\nCurrent Time = "+datetime.datetime.now().strftime("%d.%m.%Y %H:%M:%S"))
-
-
-    # Read class parameters from configuration ini file.
-    # Format:
-    # [BrewFather]
-    # Update = False
-    # UpdateURL = http://log.brewfather.net/stream?id=xxxxxxxx
-    # UpdateIntervalSeconds = 1800
+                logger.error("Exception posting to Brewfather: %s", self.getLastJSON())
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug("No update - parameters:\nbUpdate = %s\nsUrl = %s\npostdata.Name = %s\npostdata.temp = %s\npostdata.gravity = %s\npostdata.aux_temp = %s" \
+                "\nupdateTime = %s\nlastUpdateTime = %s\nCurrent Time = %s",
+                self.bUpdate, self.sURL, self.postdata["name"], self.postdata["temp"], self.postdata["gravity"], self.postdata["aux_temp"],
+                updateTime.strftime("%d.%m.%Y %H:%M:%S"), self.lastUpdateTime.strftime("%d.%m.%Y %H:%M:%S"), datetime.datetime.now().strftime("%d.%m.%Y %H:%M:%S"))
+
+
+    # Applies configuration from brewfather.ini. File is only parsed again when it has been modified.
     def _readConf(self):
+        config = _config.get()
 
-        try:
-            if os.path.isfile(CONFIGFILE) == False:
-                logger.error("BrewFather configuration file is not valid: "+CONFIGFILE)
+        if config is None or config is self.config:
+            return
 
-            ini = configparser.ConfigParser()
-            ini.read(CONFIGFILE)
+        self.config = config
+        logger.setLevel(config.messageLevel)
+        self.bUpdate = config.update
+        self.sURL = config.url
+        self.interval = config.interval
+        self.postdata["name"] = config.device
 
-            if 'BrewFather' in ini:
-                logger.debug("Reading BrewFather config")
-        
-                config = ini['BrewFather']
-                
-                try:
-                    if config["MessageLevel"] == "DEBUG":
-                        logger.setLevel(logging.DEBUG)
-                    elif config["MessageLevel"] == "WARNING":
-                        logger.setLevel(logging.WARNING)
-                    elif config["MessageLevel"] == "ERROR":
-                        logger.setLevel(logging.ERROR)
-                    elif config["MessageLevel"] == "INFO":
-                        logger.setLevel(logging.INFO)
-                    else:
-                        logger.setLevel(logging.INFO)
-                except KeyError:
-                    logger.setLevel(logging.INFO)
-                
-                if config["Update"] != "":
-                    self.bUpdate = strtobool(config.get("Update"))
-                else:
-                    raise Excpetion
-                if config["UpdateURL"] != "":
-                    self.sURL = config.get("UpdateURL")
+        logger.debug("BrewFather config:\n[BrewFather]\nUpdate = "+str(self.bUpdate)+"\nUpdateURL = "+self.sURL+"\nUpdateIntervalSeconds = "+str(self.interval))
+
+# Immutable BrewFather configuration
+BrewFatherConfig = namedtuple('BrewFatherConfig', ['messageLevel', 'update', 'url', 'interval', 'device'])
+
+# Read class parameters from configuration ini file.
+# Format:
+# [BrewFather]
+# Update = False
+# UpdateURL = http://log.brewfather.net/stream?id=xxxxxxxx
+# UpdateIntervalSeconds = 1800
+def _parseConf(ini):
+
+    level = logging.INFO
+    bUpdate = False
+    sURL = ""
+    interval = MINIMUM_INTERVAL
+    device = "Fermonitor"
+
+    try:
+        if 'BrewFather' not in ini:
+            raise Exception
+
+        logger.debug("Reading BrewFather config")
+
+        config = ini['BrewFather']
+        level = configcache.messageLevel(config)
+
+        try:
+            if config["UpdateIntervalSeconds"] != "":
+                if int(config["UpdateIntervalSeconds"]) >= MINIMUM_INTERVAL:
+                    interval = int(config.get("UpdateIntervalSeconds"))
                 else:
-                    raise Exception
-
-                try:
-                    if config["UpdateIntervalSeconds"] != "":
-                        if int(config["UpdateIntervalSeconds"]) >= MINIMUM_INTERVAL:
-                            self.interval = int(config.get("UpdateIntervalSeconds"))
-                        else:
-                            logger.warning("Brewfather update interval cannot be less than 15min; using 900s")
-                            self.interval = MINIMUM_INTERVAL
-                    else:
-                        raise Exception
-                except:
-                    logger.warning("Error reading Brewfather update interval; using 900s")
-                    self.interval = MINIMUM_INTERVAL
-
-                try:
-                    if config["Device"] != "":
-                        self.postdata["name"] = config["Device"]
-                    else:
-                        raise Exception
-                except:
-                    self.postdata["name"] = "Fermonitor"
-                    
+                    logger.warning("Brewfather update interval cannot be less than 15min; using 900s")
+                    interval = MINIMUM_INTERVAL
+            else:
+                raise Exception
+        except:
+            logger.warning("Error reading Brewfather update interval; using 900s")
+            interval = MINIMUM_INTERVAL
 
+        try:
+            if config["Device"] != "":
+                device = config["Device"]
+            else:
+                raise Exception
         except:
-            self.bUpdate = False
-            logger.warning("Problem read from configuration file: "+CONFIGFILE+". Updating BrewFather.app is disabled until configuration fixed. It could take a minute for updated values in config file to be used.")
-            print("[BrewFather]\nUpdate = "+str(self.bUpdate)+"\nUpdateURL = "+self.sURL+"\nUpdateIntervalSeconds = "+str(self.interval))
-            
-        logger.debug("BrewFather config:\n[BrewFather]\nUpdate = "+str(self.bUpdate)+"\nUpdateURL = "+self.sURL+"\nUpdateIntervalSeconds = "+str(self.interval))
+            device = "Fermonitor"
+
+        if config["UpdateURL"] != "":
+            sURL = config.get("UpdateURL")
+        else:
+            raise Exception
+
+        if config["Update"] != "":
+            bUpdate = bool(strtobool(config.get("Update")))
+        else:
+            raise Exception
+
+    except:
+        bUpdate = False
+        logger.warning("Problem read from configuration file: "+CONFIGFILE+". Updating BrewFather.app is disabled until configuration fixed. It could take a minute for updated values in config file to be used.")
+        print("[BrewFather]\nUpdate = "+str(bUpdate)+"\nUpdateURL = "+sURL+"\nUpdateIntervalSeconds = "+str(interval))
+
+    return BrewFatherConfig(level, bUpdate, sURL, interval, device)
+
+_config = configcache.register(CONFIGFILE, _parseConf)
@@ -0,0 +1,158 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import bisect
+import logging
+from collections import namedtuple
+
+import configcache
+
+logger = logging.getLogger('FERMONITOR.CALIBRATION')
+logger.setLevel(logging.INFO)
+
+CONFIGFILE = "calibration.ini"
+PROBES = "Probes"       # section with curve of each 1-wire probe by id
+TEMP = "Temp"           # keys of Tilt sections, one section per color
+SG = "SG"
+POLYNOMIAL = "POLY"     # prefix of polynomial curves
+
+# Piecewise-linear calibration through measured points (raw value -> reference value). Slopes and intercepts of the
+# segments are computed when the curve is created, so applying it is a bisect and a multiply-add. Values outside the
+# points follow the first or last segment; a single point is a constant offset.
+class PiecewiseLinear:
+
+    def __init__(self, _points):
+        points = sorted(_points)
+        if len(points) == 1:
+            points.append((points[0][0] + 1.0, points[0][1] + 1.0))
+
+        self.xs = [x for x, y in points[1:-1]]    # inner breakpoints
+        self.slopes = []
+        self.intercepts = []
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            if x1 == x0:
+                raise ValueError("Duplicate calibration point: "+str(x0))
+            slope = (y1 - y0) / (x1 - x0)
+            self.slopes.append(slope)
+            self.intercepts.append(y0 - slope * x0)
+
+    def apply(self, _value):
+        i = bisect.bisect_right(self.xs, _value)
+        return self.slopes[i] * _value + self.intercepts[i]
+
+# Polynomial calibration c0 + c1*x + c2*x^2 + ...; evaluated with Horner's method
+class Polynomial:
+
+    def __init__(self, _coefficients):
+        if len(_coefficients) == 0:
+            raise ValueError("Polynomial without coefficients")
+        self.coefficients = tuple(reversed(_coefficients))
+
+    def apply(self, _value):
+        result = 0.0
+        for c in self.coefficients:
+            result = result * _value + c
+        return result
+
+# Parses curve from configuration value; returns None if value is empty. Formats:
+#   raw:reference, raw:reference, ...   piecewise-linear through measured points, e.g. 0:0.4, 20:20.1, 65:64.5
+#   POLY c0, c1, c2, ...                polynomial c0 + c1*x + c2*x^2 ..., e.g. POLY -0.0021, 1.0015
+def parseCurve(_value):
+    _value = _value.strip()
+    if _value == "":
+        return None
+
+    if _value.upper().startswith(POLYNOMIAL):
+        return Polynomial([float(c) for c in _value[len(POLYNOMIAL):].split(",")])
+
+    points = []
+    for point in _value.split(","):
+        raw, reference = point.split(":")
+        points.append((float(raw), float(reference)))
+    return PiecewiseLinear(points)
+
+# Immutable calibration configuration: probe id -> curve and Tilt color -> curve of temperature and gravity
+CalibrationConfig = namedtuple('CalibrationConfig', ['probes', 'tiltTemps', 'tiltSGs'])
+
+EMPTY_CONFIG = CalibrationConfig({}, {}, {})
+
+# returns calibration curve of 1-wire probe; None if probe is not calibrated
+def probe(_id):
+    config = _config.get()
+    if config is None:
+        return None
+    return config.probes.get(_id)
+
+# returns calibration curve of temperature of Tilt with color; None if not calibrated
+def tiltTemp(_color):
+    config = _config.get()
+    if config is None:
+        return None
+    return config.tiltTemps.get(_color)
+
+# returns calibration curve of specific gravity of Tilt with color; None if not calibrated
+def tiltSG(_color):
+    config = _config.get()
+    if config is None:
+        return None
+    return config.tiltSGs.get(_color)
+
+# applies curve to value; value is returned unchanged if there is no curve
+def apply(_curve, _value):
+    if _curve is None or _value is None:
+        return _value
+    return _curve.apply(_value)
+
+# Read curves from configuration ini file.
+# Format:
+# [Probes]
+# 28-02148151b0ff = 0:0.4, 20:20.1, 65:64.5
+# [RED]
+# Temp = 0:0.2, 30:29.6
+# SG = POLY -0.0021, 1.0015
+def _parseConf(ini):
+    probes = {}
+    tiltTemps = {}
+    tiltSGs = {}
+
+    for name in ini.sections():
+        for key, value in ini[name].items():
+            try:
+                curve = parseCurve(value)
+            except (ValueError, IndexError):
+                logger.warning("Invalid calibration of "+name+" "+key+"; value is not calibrated: "+value)
+                continue
+            if curve is None:
+                continue
+
+            if name == PROBES:
+                probes[key] = curve
+            elif key.lower() == TEMP.lower():
+                tiltTemps[name.upper()] = curve
+            elif key.lower() == SG.lower():
+                tiltSGs[name.upper()] = curve
+            else:
+                logger.warning("Unknown calibration key "+key+" in section: "+name)
+
+    return CalibrationConfig(probes, tiltTemps, tiltSGs)
+
+_config = configcache.register(CONFIGFILE, _parseConf)
@@ -19,94 +19,269 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import os
 import threading
 import datetime
 import time
 
 import logging
 
+from collections import namedtuple
+
 import tilt
-import configparser
-import RPi.GPIO as GPIO
+import sensorbus
+import configcache
+import onewire
+import schedule
+import relay
+import statefile
+from hardware import GPIO
 
 logger = logging.getLogger('FERMONITOR.CHAMBER')
 logger.setLevel(logging.INFO)
 
 UPDATE_INVERVAL = 1 # update interval in seconds
+MIN_UPDATE_INTERVAL = 0.1   # shortest update interval when probes convert faster than UPDATE_INVERVAL
 CONFIGFILE = "chamber.ini"
+SECTION = "Chamber"  # section of the first chamber; further chambers are in sections starting with the same name
 
 DEFAULT_TEMP = -999
 DEFAULT_BUFFER_BEER_TEMP = 0.5       # +/- degrees celcius beer is from target when heating/cooling will be turned on
 DEFAULT_BUFFER_CHAMBER_SCALE = 5.0   # scale factor of temperature delta chamber is from target controlling when heating/cooling will be turned on/off
 DEFAULT_ON_DELAY = 600
-TEMP_CHANGE_THRESHOLD = 5.0
+DEFAULT_MAX_READING_AGE = 15        # seconds after which a probe reading is stale
+
+# What to do with a probe reading older than MaxReadingAge
+STALE_HOLD = "HOLD"             # keep controlling with the last good reading
+STALE_FALLBACK = "FALLBACK"     # use the other probe of the chamber instead; relays off if both are stale
+STALE_OFF = "OFF"               # turn heating and cooling off
+DEFAULT_STALE_POLICY = STALE_OFF
+
+# Quality of beer and chamber temperature in addition to the qualities of onewire reads
+STALE = "STALE"                 # reading is older than MaxReadingAge
+FALLBACK = "FALLBACK"           # temperature of the other probe is used
+MISSING = "MISSING"             # probe is not connected
+RESTORED = "RESTORED"           # temperature saved before restart; replaced by first reading
+
+DEFAULT_BEER_PROBE = '28-02148151b0ff'
+DEFAULT_CHAMBER_PROBE = '28-0417004ebfff'
+
+# Clock used for schedule, on delay and age of Tilt data; simulations replace it with a virtual clock
+now = datetime.datetime.now
 
 PIN_HEAT_RELAY = 5 # motion pin
 PIN_HEAT_LED = 23 # motion pin
 PIN_COOL_RELAY = 6 # motion pin
 PIN_COOL_LED = 24 # motion pin
 
+# Relays of a chamber
+HEAT = "heating"
+COOL = "cooling"
+
+# Immutable snapshot of chamber state; temperatures are None when not available. Version only changes when any
+# value other than time changes, so readers can skip work while version is unchanged.
+ChamberState = namedtuple('ChamberState', ['version', 'targetTemp', 'beerTemp', 'wireBeerTemp', 'chamberTemp', 'tiltControlled', 'heating', 'cooling', 'beerQuality', 'chamberQuality', 'time'])
+
+EMPTY_STATE = ChamberState(0, None, None, None, None, False, False, False, onewire.NONE, onewire.NONE, None)
+
+# Controls heating and cooling of one fermentation chamber. A chamber either runs in its own thread (start()) or is
+# stepped by a scheduler driving several chambers (see fermenters.py); in that case the probe registry is shared.
+# Settings are read from the section of chamber.ini with the name of the chamber.
 class Chamber(threading.Thread):
 
-    def __init__(self, _tilt):
+    def __init__(self, _tilt, _bus=None, _name=SECTION, _probes=None):
         threading.Thread.__init__(self)
 
+        self.name = _name
+        config = _sectionConf(_name)
+
         # Set the GPIO naming conventions
         GPIO.setmode (GPIO.BCM)
         GPIO.setwarnings(False)
-        GPIO.setup(PIN_HEAT_RELAY, GPIO.OUT) # GPIO Assign mode
-        GPIO.setup(PIN_HEAT_LED, GPIO.OUT) # GPIO Assign mode
-        GPIO.setup(PIN_COOL_RELAY, GPIO.OUT) # GPIO Assign mode
-        GPIO.setup(PIN_COOL_LED, GPIO.OUT) # GPIO Assign mode
 
+        # pins are only written when a relay changes state; pins can only be changed with restart
+        self.relays = {
+            HEAT: relay.Relay(HEAT, config.heatRelayPin, config.heatLedPin),
+            COOL: relay.Relay(COOL, config.coolRelayPin, config.coolLedPin)}
 
         self.stopThread = True              # flag used for stopping the background thread
         self.tilt = _tilt
+        self.bus = _bus                     # sensor bus new readings are published to; optional
+        self.batchStart = None              # first date of schedule; duty cycle totals are kept per batch
+        self.topic = sensorbus.TOPIC_CHAMBER if _name == SECTION else sensorbus.TOPIC_CHAMBER + ":" + _name
+        self.ownProbes = _probes is None
+        self.probes = onewire.ProbeRegistry() if _probes is None else _probes  # connected probes, sampled in the background
+        self.beerProbe = DEFAULT_BEER_PROBE
+        self.chamberProbe = DEFAULT_CHAMBER_PROBE
+        self.state = EMPTY_STATE
+        self.config = None
         self.tiltcolor = None
-        self.tempDates = [datetime.datetime.now()]
+        self.tempDates = [now()]
         self.targetTemps = [DEFAULT_TEMP]
+        self.schedule = schedule.Schedule(self.tempDates, self.targetTemps)
         self.targetTemp = DEFAULT_TEMP
         self.bufferBeerTemp = DEFAULT_BUFFER_BEER_TEMP
         self.bufferChamberScale = DEFAULT_BUFFER_CHAMBER_SCALE
         self.beerTemp = DEFAULT_TEMP
         self.beerWireTemp = DEFAULT_TEMP
         self.chamberTemp = DEFAULT_TEMP
-        self.timeData = datetime.datetime.now()
+        self.beerQuality = onewire.NONE
+        self.chamberQuality = onewire.NONE
+        self.beerAge = None                 # seconds since latest good reading of wired probes
+        self.chamberAge = None
+        self.heldBeerTemp = DEFAULT_TEMP    # latest good temperatures of wired probes, used by StalePolicy HOLD
+        self.heldChamberTemp = DEFAULT_TEMP
+        self.staleProbes = set()            # probes currently considered stale, to log changes only once
+        self.bTempUnavailable = False       # heating/cooling is off because beer or chamber temperature is unavailable
+        self.startTime = None               # time of first control cycle; probes may not be read yet shortly after
+        self.maxReadingAge = DEFAULT_MAX_READING_AGE
+        self.stalePolicy = DEFAULT_STALE_POLICY
+        self.timeData = now()
         self.bTiltControlled = False
+        self.tiltProblem = None             # why Tilt temperature is not used; logged when it changes
 
         self.onDelay = DEFAULT_ON_DELAY
         self.beerTAdjust = 0.0
         self.chamberTAdjust = 0.0
 
-        self.coolEndTime = datetime.datetime.now() - datetime.timedelta(seconds=self.onDelay*2)
-        self.heatEndTime = datetime.datetime.now() - datetime.timedelta(seconds=self.onDelay*2)
+        self.coolEndTime = now() - datetime.timedelta(seconds=self.onDelay*2)
+        self.heatEndTime = now() - datetime.timedelta(seconds=self.onDelay*2)
 
         self.bHeatOn = False
         self.bCoolOn = False
-        self._controlheatingcooling(PIN_HEAT_RELAY, PIN_HEAT_LED, False)
-        self._controlheatingcooling(PIN_COOL_RELAY, PIN_COOL_LED, False)
+        self._controlheatingcooling(HEAT, False)
+        self._controlheatingcooling(COOL, False)
+        self._updateState()
         
+    # returns latest consistent state of chamber; one call instead of several getters that could be from different
+    # evaluations
+    def snapshot(self):
+        return self.state
+
+    # version of latest state; changes whenever any reading or relay state changes
+    def getVersion(self):
+        return self.state.version
+
+    # version of configuration (schedule, buffers); changes whenever chamber.ini is reloaded
+    def getConfigVersion(self):
+        return _config.getVersion()
+
     def isHeating(self):
-        return self.bHeatOn
+        return self.state.heating
 
     def isCooling(self):
-        return self.bCoolOn
+        return self.state.cooling
+
+    # returns relay name -> state, number of transitions and pin writes
+    def getRelayStats(self):
+        return {r.name: r.getStats() for r in self.relays.values()}
+
+    # returns relay name -> on-time, cycles, average on/off duration, duty cycle of batch, last hour and last day and
+    # energy in kWh if wattage is configured
+    def getDutyStats(self):
+        return {r.name: r.getDutyStats() for r in self.relays.values()}
+
+    # returns relay name -> list of (monotonic time, state) of latest transitions
+    def getRelayTransitions(self):
+        return {r.name: r.getTransitions() for r in self.relays.values()}
+
+    # returns read statistics of each probe and bulk conversion statistics of each bus master: probe id or bus master
+    # name -> dictionary of counters and durations in seconds
+    def getProbeStats(self):
+        return self.probes.getStats()
 
     # Starts the background thread
     def run(self):
         logger.info("Starting Chamber")
         self.stopThread = False
+
+        # probes are read concurrently in the background so a cycle never waits for a conversion
+        if self.ownProbes:
+            self.probes.start()
         
         while self.stopThread != True:
-            self._readConf()
-            self._evaluate()
-            time.sleep(UPDATE_INVERVAL)
+            self.step()
+            time.sleep(self.getInterval())
 
-        self._controlheatingcooling(PIN_COOL_RELAY, PIN_COOL_LED, False)
-        self._controlheatingcooling(PIN_HEAT_RELAY, PIN_HEAT_LED, False)
+        if self.ownProbes:
+            self.probes.stop()
+
+        self.shutdown()
         logger.info("Chamber Stopped")
 
+    # returns state to be saved for a restart: on delay timers, relay states and latest readings
+    def getCheckpoint(self):
+        return {
+            "heatEndTime": statefile.encodeTime(self.heatEndTime),
+            "coolEndTime": statefile.encodeTime(self.coolEndTime),
+            "heating": self.bHeatOn,
+            "cooling": self.bCoolOn,
+            "beerTemp": _validTemp(self.beerTemp),
+            "wireBeerTemp": _validTemp(self.beerWireTemp),
+            "chamberTemp": _validTemp(self.chamberTemp),
+            "batch": statefile.encodeTime(self.batchStart),
+            "duty": {r.name: r.getDutyCheckpoint() for r in self.relays.values()},
+            "time": statefile.encodeTime(now())}
+
+    # Applies state saved by getCheckpoint() before a restart. On delay continues from the saved end times; a relay
+    # that was on may have run until the restart, so its on delay starts now. Readings are only shown until the
+    # first good reading of the probes or until MaxReadingAge passed; control never uses them.
+    def restore(self, _data):
+        if not isinstance(_data, dict):
+            return
+
+        _curTime = now()
+        _heatEnd = statefile.decodeTime(_data.get("heatEndTime"))
+        _coolEnd = statefile.decodeTime(_data.get("coolEndTime"))
+        if _heatEnd is not None and _heatEnd <= _curTime:
+            self.heatEndTime = _heatEnd
+        if _coolEnd is not None and _coolEnd <= _curTime:
+            self.coolEndTime = _coolEnd
+        if _data.get("heating") == True:
+            self.heatEndTime = _curTime
+        if _data.get("cooling") == True:
+            self.coolEndTime = _curTime
+
+        # on-time of the batch continues unless a new batch started since
+        self.batchStart = statefile.decodeTime(_data.get("batch"))
+        _duty = _data.get("duty")
+        if isinstance(_duty, dict):
+            for r in self.relays.values():
+                r.restoreDuty(_duty.get(r.name))
+
+        _time = statefile.decodeTime(_data.get("time"))
+        self.state = self.state._replace(
+            version=self.state.version+1,
+            beerTemp=_data.get("beerTemp"),
+            wireBeerTemp=_data.get("wireBeerTemp"),
+            chamberTemp=_data.get("chamberTemp"),
+            beerQuality=RESTORED,
+            chamberQuality=RESTORED,
+            time=_time if _time is not None else self.state.time)
+        logger.info("Restored state of %s saved: %s", self.name, _data.get("time"))
+
+    # one control cycle: apply configuration changes, evaluate readings and publish resulting state
+    def step(self):
+        if self.startTime is None:
+            self.startTime = now()
+        self._readConf()
+        self._evaluate()
+        for r in self.relays.values():
+            r.tick()
+        self._updateState()
+
+    # Returns seconds until next control cycle: as soon as both probes can have a new reading, which depends on their
+    # resolution, but at least every UPDATE_INVERVAL so Tilt readings and schedule changes are followed
+    def getInterval(self):
+        _period = self.probes.getPeriod([self.beerProbe, self.chamberProbe])
+        if _period is None:
+            return UPDATE_INVERVAL
+        return min(UPDATE_INVERVAL, max(MIN_UPDATE_INTERVAL, _period))
+
+    # turns heating and cooling off
+    def shutdown(self):
+        self._controlheatingcooling(COOL, False)
+        self._controlheatingcooling(HEAT, False)
+
 
     def __del__(self):
         logger.debug("Delete chamber class")
@@ -123,72 +298,119 @@ class Chamber(threading.Thread):
 
         # read latest temperatures
         self._readChamberTemp()
+        self._readWireBeerTemp()
+        self._applyStalePolicy()
         self._readBeerTemp()
 
-        _curTime = datetime.datetime.now()
-            
-        # check which of the temperature change dates have passed
-        datesPassed = 0
-        for dt in self.tempDates:
-            if dt < _curTime:
-                datesPassed = datesPassed + 1
-        
+        _curTime = now()
+
+        # target of schedule at current time; None before first and after last date
+        _target = self.schedule.target(_curTime)
+
         # No configured dates have passed, leave chamer powered off
-        if datesPassed == 0:
+        if _target is None and self.schedule.notStarted(_curTime):
             self.targetTemp = DEFAULT_TEMP
 
             # Turn off heating and cooling
-            logger.debug("Leaving chamber heating/cooling off until first date reached: " + self.tempDates[datesPassed].strftime("%d.%m.%Y %H:%M:%S"))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Leaving chamber heating/cooling off until first date reached: %s", self.tempDates[0].strftime("%d.%m.%Y %H:%M:%S"))
             
-            self._controlheatingcooling(PIN_HEAT_RELAY, PIN_HEAT_LED, False)
-            self._controlheatingcooling(PIN_COOL_RELAY, PIN_COOL_LED, False)
+            self._controlheatingcooling(HEAT, False)
+            self._controlheatingcooling(COOL, False)
             return
 
         # check if last date has been reached. If so, heating/cooling should stop
-        elif datesPassed == len(self.tempDates):
+        elif _target is None:
             self.targetTemp = DEFAULT_TEMP
 
             # Turn off heating and cooling
-            logger.debug("Last date reached turning heating/cooling off: " + self.tempDates[datesPassed-1].strftime("%d.%m.%Y %H:%M:%S"))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Last date reached turning heating/cooling off: %s", self.tempDates[-1].strftime("%d.%m.%Y %H:%M:%S"))
             
-            self._controlheatingcooling(PIN_HEAT_RELAY, PIN_HEAT_LED, False)
-            self._controlheatingcooling(PIN_COOL_RELAY, PIN_COOL_LED, False)
+            self._controlheatingcooling(HEAT, False)
+            self._controlheatingcooling(COOL, False)
             return
 
         # date is within configured range    
         else:
-            self.targetTemp = self.targetTemps[datesPassed-1]
+            self.targetTemp = _target
+
+            # without valid temperatures no decision can be made; leave heating/cooling off
+            if self.beerTemp == DEFAULT_TEMP or self.chamberTemp == DEFAULT_TEMP:
+                if not self.bTempUnavailable:
+                    logger.warning("Beer or chamber temperature of %s unavailable; turning heating/cooling off", self.name)
+                    self.bTempUnavailable = True
+                self._controlheatingcooling(HEAT, False)
+                self._controlheatingcooling(COOL, False)
+                return
+
+            if self.bTempUnavailable:
+                logger.info("Beer and chamber temperature of %s available again; resuming control", self.name)
+                self.bTempUnavailable = False
 
             # beer is warmer than target + buffer, consider cooling
             if self.beerTemp > (self.targetTemp + self.bufferBeerTemp):
                 # check how much cooler chamber is compared to target, do not want it too low or beer temperature will overshoot too far.
                 if (self.targetTemp - self.chamberTemp) < self.bufferChamberScale*(self.beerTemp - self.targetTemp):
                     # Turn cooling ON
-                    logger.debug("Cooling to be turned ON - Target: " + str(self.targetTemp) + "; Beer: " + str(self.beerTemp) + "; Chamber: " + str(self.chamberTemp) + "; Beer Buffer: " + str(self.bufferBeerTemp) + "; Chamber Scale: " + str(self.bufferChamberScale))
-                    self._controlheatingcooling(PIN_COOL_RELAY, PIN_COOL_LED, True)
+                    logger.debug("Cooling to be turned ON - Target: %s; Beer: %s; Chamber: %s; Beer Buffer: %s; Chamber Scale: %s", self.targetTemp, self.beerTemp, self.chamberTemp, self.bufferBeerTemp, self.bufferChamberScale)
+                    self._controlheatingcooling(COOL, True)
                 else:
                     logger.debug("Chamber is cold enough to cool beer")
-                    self._controlheatingcooling(PIN_COOL_RELAY, PIN_COOL_LED, False)
-                    self._controlheatingcooling(PIN_HEAT_RELAY, PIN_HEAT_LED, False)
+                    self._controlheatingcooling(COOL, False)
+                    self._controlheatingcooling(HEAT, False)
 
             # beer is cooler than target + buffer, consider heating
             elif self.beerTemp < (self.targetTemp - self.bufferBeerTemp):
                 # check how much hotter chamber is compared to target, do not want it too high or beer temperature will overshoot too far.
                if (self.chamberTemp - self.targetTemp) < self.bufferChamberScale*(self.targetTemp - self.beerTemp):
                     # Turn heating ON
-                    logger.debug("Heating to be turned ON - Target: " + str(self.targetTemp) + "; Beer: " + str(self.beerTemp) + "; Chamber: " + str(self.chamberTemp) + "; Beer Buffer: " + str(self.bufferBeerTemp) + "; Chamber Scale: " + str(self.bufferChamberScale))
-                    self._controlheatingcooling(PIN_HEAT_RELAY, PIN_HEAT_LED, True)
+                    logger.debug("Heating to be turned ON - Target: %s; Beer: %s; Chamber: %s; Beer Buffer: %s; Chamber Scale: %s", self.targetTemp, self.beerTemp, self.chamberTemp, self.bufferBeerTemp, self.bufferChamberScale)
+                    self._controlheatingcooling(HEAT, True)
                else:
                     logger.debug("Chamber is warm enough to heat beer")
-                    self._controlheatingcooling(PIN_COOL_RELAY, PIN_COOL_LED, False)
-                    self._controlheatingcooling(PIN_HEAT_RELAY, PIN_HEAT_LED, False)
+                    self._controlheatingcooling(COOL, False)
+                    self._controlheatingcooling(HEAT, False)
 
             # beer is within range of target +/- buffer
             else:
-                logger.debug("No heating/cooling needed - Target: " + str(self.targetTemp) + "; Beer: " + str(self.beerTemp) + "; Chamber: " + str(self.chamberTemp) + "; Beer Buffer: " + str(self.bufferBeerTemp) + "; Chamber Scale: " + str(self.bufferChamberScale))
-                self._controlheatingcooling(PIN_COOL_RELAY, PIN_COOL_LED, False)
-                self._controlheatingcooling(PIN_HEAT_RELAY, PIN_HEAT_LED, False)
-
+                logger.debug("No heating/cooling needed - Target: %s; Beer: %s; Chamber: %s; Beer Buffer: %s; Chamber Scale: %s", self.targetTemp, self.beerTemp, self.chamberTemp, self.bufferBeerTemp, self.bufferChamberScale)
+                self._controlheatingcooling(COOL, False)
+                self._controlheatingcooling(HEAT, False)
+
+
+    # Replaces snapshot of state read by other threads with the result of the latest evaluation. If any value
+    # changed the version is incremented and the new state is published to the sensor bus.
+    def _updateState(self):
+        _state = ChamberState(
+            self.state.version,
+            _validTemp(self.targetTemp),
+            _validTemp(self.beerTemp),
+            _validTemp(self.beerWireTemp),
+            _validTemp(self.chamberTemp),
+            self.bTiltControlled,
+            self.bHeatOn,
+            self.bCoolOn,
+            self.beerQuality,
+            self.chamberQuality,
+            self.timeData)
+
+        # restored readings stay until the probe has a good reading; control only uses self.beerWireTemp and self.chamberTemp
+        if self.state.beerQuality == RESTORED and self._starting(self.beerAge):
+            _state = _state._replace(wireBeerTemp=self.state.wireBeerTemp, beerQuality=RESTORED)
+            if not self.bTiltControlled:
+                _state = _state._replace(beerTemp=self.state.beerTemp)
+        if self.state.chamberQuality == RESTORED and self._starting(self.chamberAge):
+            _state = _state._replace(chamberTemp=self.state.chamberTemp, chamberQuality=RESTORED)
+
+        # time of data changes with every reading so it is not considered a change on its own
+        if _state[1:-1] != self.state[1:-1]:
+            _state = _state._replace(version=self.state.version+1)
+            self.state = _state
+            if self.bus is not None:
+                self.bus.publish(self.topic, _state)
+        else:
+            self.state = _state
 
     def getDates(self):
         return self.tempDates.copy()
@@ -197,31 +419,21 @@ class Chamber(threading.Thread):
         return self.targetTemps.copy()
 
     def getTargetTemp(self):
-        if self.targetTemp != DEFAULT_TEMP:
-            return self.targetTemp
-        return None
+        return self.state.targetTemp
 
     def getBeerTemp(self):
-        if self.beerTemp != DEFAULT_TEMP:
-            return self.beerTemp
-        return None
+        return self.state.beerTemp
 
     def getWiredBeerTemp(self):
-        if self.beerWireTemp != DEFAULT_TEMP:
-            return self.beerWireTemp
-        return None
+        return self.state.wireBeerTemp
 
     def getChamberTemp(self):
-        if self.chamberTemp != DEFAULT_TEMP:
-            return self.chamberTemp
-        return None
+        return self.state.chamberTemp
 
     # reads beer temperature from tilt, if configured and less than 5min old, or wire and returns value
     def _readBeerTemp(self):
         logger.debug("getBeerTemp")
 
-        self._readWireBeerTemp()
-
         _tiltdata = {}
 
         # if Tilt is configured and available replace related values
@@ -231,31 +443,33 @@ class Chamber(threading.Thread):
             if _tiltdata is not None:
                 _tiltdatatime = _tiltdata[tilt.TIME]
             
-                if _tiltdatatime is not None and _tiltdatatime > datetime.datetime.now() - datetime.timedelta(minutes=5):
+                if _tiltdatatime is not None and _tiltdatatime > now() - datetime.timedelta(minutes=5):
                     _beerTemp = _tiltdata[tilt.TEMP]
                     if _beerTemp is not None:
                         self.beerTemp = _beerTemp
                         self.bTiltControlled = True
+                        self._logTiltProblem(None)
 
                         if self.timeData < _tiltdatatime:
                             self.timeData = _tiltdatatime
                     else:
-                        logger.warning("Temp for "+self.tiltcolor+" tilt is None; using wired temperatures")
-                        self.beerTemp = self.getWiredBeerTemp()
+                        self._logTiltProblem("Temp for %s tilt is None")
+                        self.beerTemp = self.beerWireTemp
                         self.bTiltControlled = False
 
                 else:
-                    logger.warning("Data for "+self.tiltcolor+" tilt is outdated; using wired temperatures")
-                    self.beerTemp = self.getWiredBeerTemp()
+                    self._logTiltProblem("Data for %s tilt is outdated")
+                    self.beerTemp = self.beerWireTemp
                     self.bTiltControlled = False
             else:
-                logger.warning("Data for "+self.tiltcolor+" tilt unavailable; using wired temperatures")
-                self.beerTemp = self.getWiredBeerTemp()
+                self._logTiltProblem("Data for %s tilt unavailable")
+                self.beerTemp = self.beerWireTemp
                 self.bTiltControlled = False
         # Tilt is not configured or color is not specified
         else:
            logger.debug("Tilt not configured, using wired beer temp")
-           self.beerTemp = self.getWiredBeerTemp()
+           self.tiltProblem = None
+           self.beerTemp = self.beerWireTemp
            self.bTiltControlled = False
 
         if self.beerTemp == DEFAULT_TEMP:
@@ -265,19 +479,28 @@ class Chamber(threading.Thread):
         else:
             return self.beerTemp
     
+    # logs why Tilt temperature is not used when the reason changes instead of every control cycle; None once it is
+    # used again
+    def _logTiltProblem(self, _problem):
+        if _problem == self.tiltProblem:
+            return
+        if _problem is not None:
+            logger.warning(_problem + "; using wired temperatures", self.tiltcolor)
+        else:
+            logger.info("Using temperature of %s tilt again", self.tiltcolor)
+        self.tiltProblem = _problem
+
     def _readWireBeerTemp(self):
         logger.debug("getWireBeerTemp")
 
-        id = '28-02148151b0ff'
+        id = self.beerProbe
 
-        _temp = self._readTemp(id) + self.beerTAdjust
-        
-        # if the stored temperature is default value or less than change threshold with updated reading, store new value
-        if self.beerWireTemp == DEFAULT_TEMP or abs(_temp - self.beerWireTemp) < TEMP_CHANGE_THRESHOLD:
-            self.beerWireTemp = _temp
-        # bigger jump in temperature threshold, take average of 10 readings
+        # readings are already spike filtered by the probe
+        _temp, self.beerQuality, self.beerAge = self._readTemp(id)
+        if _temp == DEFAULT_TEMP:
+            self.beerWireTemp = DEFAULT_TEMP
         else:
-            self.beerWireTemp = self._avgTemp(id,10) + self.beerTAdjust
+            self.beerWireTemp = _temp + self.beerTAdjust
 
         if self.beerWireTemp == DEFAULT_TEMP:
             return None
@@ -287,16 +510,14 @@ class Chamber(threading.Thread):
     def _readChamberTemp(self):
         logger.debug("getChamberTemp")
         
-        id = '28-0417004ebfff'
+        id = self.chamberProbe
 
-        _temp = self._readTemp(id) + self.chamberTAdjust
-        
-        # if the stored temperature is default value or less than change threshold with updated reading, store new value
-        if self.chamberTemp == DEFAULT_TEMP or abs(_temp - self.chamberTemp) < TEMP_CHANGE_THRESHOLD:
-            self.chamberTemp = _temp
-        # bigger jump in temperature threshold, take average of 10 readings
+        # readings are already spike filtered by the probe
+        _temp, self.chamberQuality, self.chamberAge = self._readTemp(id)
+        if _temp == DEFAULT_TEMP:
+            self.chamberTemp = DEFAULT_TEMP
         else:
-            self.chamberTemp = self._avgTemp(id,10) + self.chamberTAdjust
+            self.chamberTemp = _temp + self.chamberTAdjust
 
         if self.chamberTemp == DEFAULT_TEMP:
             return None
@@ -304,220 +525,438 @@ class Chamber(threading.Thread):
             return self.chamberTemp
 
     def isTiltControlled(self):
-        return self.bTiltControlled
+        return self.state.tiltControlled
 
 
+    # sets color of Tilt used for beer temperature unless color is configured for the chamber in chamber.ini
     def setTiltColor(self, _color):
+        if self.config is not None and self.config.tiltColor is not None:
+            return
         if tilt.validColor(_color):
             self.tiltcolor = _color
         else:
             self.tiltcolor = None
 
+    # returns color of Tilt used for beer temperature; None if wired probe is used
+    def getTiltColor(self):
+        return self.tiltcolor
+
     # returns time when data was updated
     def timeOfData(self):
-        return self.timeData
+        return self.state.time
 
-    def _controlheatingcooling(self, _relay, _led, _bool):
+    def _controlheatingcooling(self, _relay, _bool):
         logger.debug("_controlheatingcooling")
 
-        curTime = datetime.datetime.now()
-        sTime = curTime.strftime("%d.%m.%Y %H:%M:%S")
+        curTime = now()
 
-        if _relay == PIN_HEAT_RELAY and self.bHeatOn == True and _bool == False:
+        if _relay == HEAT and self.bHeatOn == True and _bool == False:
             self.heatEndTime = curTime
             self.bHeatOn = False
 
-        elif _relay == PIN_HEAT_RELAY and self.bHeatOn == False and _bool == True:
-            self._controlheatingcooling(PIN_COOL_RELAY, PIN_COOL_LED, False)
+        elif _relay == HEAT and self.bHeatOn == False and _bool == True:
+            self._controlheatingcooling(COOL, False)
 
             if curTime < self.heatEndTime + datetime.timedelta(seconds=self.onDelay):
-                logger.debug("("+sTime+"): on delay has not expired: "+(self.heatEndTime + datetime.timedelta(seconds=self.onDelay)).strftime("%d.%m.%Y %H:%M:%S"))
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("(%s): on delay has not expired: %s", curTime.strftime("%d.%m.%Y %H:%M:%S"), (self.heatEndTime + datetime.timedelta(seconds=self.onDelay)).strftime("%d.%m.%Y %H:%M:%S"))
                 return
 
             self.bHeatOn = True 
         
-        elif _relay == PIN_COOL_RELAY and self.bCoolOn == True and _bool == False:
+        elif _relay == COOL and self.bCoolOn == True and _bool == False:
             self.coolEndTime = curTime
             self.bCoolOn = False
 
-        elif _relay == PIN_COOL_RELAY and self.bCoolOn == False and _bool == True:
-            self._controlheatingcooling(PIN_HEAT_RELAY, PIN_HEAT_LED, False)
+        elif _relay == COOL and self.bCoolOn == False and _bool == True:
+            self._controlheatingcooling(HEAT, False)
 
             if curTime < self.coolEndTime + datetime.timedelta(seconds=self.onDelay):
-                logger.debug("("+sTime+"): on delay has not expired: "+(self.coolEndTime + datetime.timedelta(seconds=self.onDelay)).strftime("%d.%m.%Y %H:%M:%S"))
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("(%s): on delay has not expired: %s", curTime.strftime("%d.%m.%Y %H:%M:%S"), (self.coolEndTime + datetime.timedelta(seconds=self.onDelay)).strftime("%d.%m.%Y %H:%M:%S"))
                 return
 
             self.bCoolOn = True
 
-        if _bool:
-            logger.debug("("+sTime+"): Turn ON relay: "+str(_relay))
-            GPIO.output(_relay, GPIO.LOW) # Turn relay ON
-            GPIO.output(_led, GPIO.HIGH) # Turn led ON
-        else:
-            logger.debug("("+sTime+"): Turn relay OFF: "+str(_relay))
-            GPIO.output(_relay, GPIO.HIGH) # Turn relay OFF
-            GPIO.output(_led, GPIO.LOW) # Turn led OFF
+        # relay and its led are only written when state changes
+        if self.relays[_relay].set(_bool) and logger.isEnabledFor(logging.DEBUG):
+            if _bool:
+                logger.debug("(%s): Turn ON relay: %s", curTime.strftime("%d.%m.%Y %H:%M:%S"), _relay)
+            else:
+                logger.debug("(%s): Turn relay OFF: %s", curTime.strftime("%d.%m.%Y %H:%M:%S"), _relay)
 
-    def _avgTemp(self, id, _num):
-        logger.debug("_avgtemp")
+    # returns (temperature, quality, age in seconds) of latest good reading of probe without blocking; DEFAULT_TEMP
+    # if the probe was never read. Readings older than MaxReadingAge have quality STALE unless the latest read failed.
+    def _readTemp(self, id):
+        logger.debug("_gettemp")
 
-        interval = 0
-        _temp = 0.0
+        _probe = self.probes.getProbe(id)
+        if _probe is None:
+            return DEFAULT_TEMP, MISSING, None
 
-        for i in range (0, _num):
-            t = self._readTemp(id)
-            if t != DEFAULT_TEMP:
-                _temp += t
-                interval += 1
+        _reading = _probe.getSample()
+        if _reading.temp is None:
+            return DEFAULT_TEMP, _reading.quality, None
 
-        logger.debug("_avgtemp: "+(str)(_temp/interval))
-        return _temp/interval
+        if _reading.age > self.maxReadingAge and _reading.quality == onewire.GOOD:
+            _reading = _reading._replace(quality=STALE)
 
+        if _reading.quality == onewire.GOOD and self.timeData < _reading.time:
+            self.timeData = _reading.time
 
-    def _readTemp(self, id):
-        logger.debug("_gettemp")
-        try:
-            mytemp = ''
-            filename = 'w1_slave'
-            f = open('/sys/bus/w1/devices/' + id + '/' + filename, 'r')
-            line = f.readline() # read 1st line
-            crc = line.rsplit(' ',1)
-            crc = crc[1].replace('\n', '')
-            if crc=='YES':
-                line = f.readline() # read 2nd line
-                mytemp = line.rsplit('t=',1)
-            else:
-                mytemp = DEFAULT_TEMP
-            f.close()
-            
-            self.timeData = datetime.datetime.now()
+        logger.debug("_gettemp: %s", _reading.temp)
+        return _reading.temp, _reading.quality, _reading.age
 
-            _temp = (float)(mytemp[1])/1000
+    # Replaces wired temperatures older than MaxReadingAge, of missing probes and of probes without a good reading
+    # according to StalePolicy; temperatures set to DEFAULT_TEMP turn heating and cooling off
+    def _applyStalePolicy(self):
+        _beerStale = self._isStale(self.beerWireTemp, self.beerAge)
+        _chamberStale = self._isStale(self.chamberTemp, self.chamberAge)
+        if self.beerWireTemp != DEFAULT_TEMP:
+            self.heldBeerTemp = self.beerWireTemp
+        if self.chamberTemp != DEFAULT_TEMP:
+            self.heldChamberTemp = self.chamberTemp
 
-            logger.debug("_gettemp: "+(str)(_temp))
+        # probes not read yet after a start are not reported as stale until MaxReadingAge passed
+        _stale = set()
+        if _beerStale and not self._starting(self.beerAge):
+            _stale.add("beer")
+        if _chamberStale and not self._starting(self.chamberAge):
+            _stale.add("chamber")
+        self._logStale(_stale)
 
-            return _temp
+        if not _beerStale and not _chamberStale:
+            return
 
-        except:
-            return DEFAULT_TEMP
-
-    # Read class parameters from configuration ini file.
-    # Format:
-    # [Chamber]
-    # MessageLevel = INFO
-    # Temps = 18,21,0
-    # Dates = 26/03/2019 12:00:00,28/09/2019 13:00:00,14/10/2019 14:00:00,20/04/2020 14:00:00
-    # BeerTemperatureBuffer = 0.2
-    # ChamberScaleBuffer = 5.0    
-    def _readConf(self):
+        if self.stalePolicy == STALE_HOLD:
+            if _beerStale:
+                self.beerWireTemp = self.heldBeerTemp
+            if _chamberStale:
+                self.chamberTemp = self.heldChamberTemp
+            return
 
-        try:
-            if os.path.isfile(CONFIGFILE) == False:
-                logger.error("Chamber configuration file is not valid: "+CONFIGFILE)
+        if self.stalePolicy == STALE_FALLBACK and _beerStale != _chamberStale:
+            if _beerStale and self.chamberTemp != DEFAULT_TEMP:
+                self.beerWireTemp = self.chamberTemp
+                self.beerQuality = FALLBACK
+                return
+            if _chamberStale and self.beerWireTemp != DEFAULT_TEMP:
+                self.chamberTemp = self.beerWireTemp
+                self.chamberQuality = FALLBACK
+                return
 
-            ini = configparser.ConfigParser()
-            ini.read(CONFIGFILE)
+        if _beerStale:
+            self.beerWireTemp = DEFAULT_TEMP
+        if _chamberStale:
+            self.chamberTemp = DEFAULT_TEMP
+
+    # True if a probe has no good reading yet (age is None) and MaxReadingAge has not passed since the first control
+    # cycle
+    def _starting(self, age):
+        if age is not None:
+            return False
+        return self.startTime is None or (now() - self.startTime).total_seconds() <= self.maxReadingAge
+
+    def _isStale(self, temp, age):
+        return temp == DEFAULT_TEMP or (age is not None and age > self.maxReadingAge)
+
+    # logs when probes become stale and when they recover, instead of every control cycle
+    def _logStale(self, stale):
+        _new = stale - self.staleProbes
+        _recovered = self.staleProbes - stale
+        self.staleProbes = stale
+
+        if _new:
+            logger.warning("Stale reading of %s probe of %s; stale: %s; policy: %s", ", ".join(sorted(_new)), self.name,
+                ", ".join(sorted(stale)), self.stalePolicy)
+        if _recovered:
+            logger.info("Reading of %s probe of %s recovered", ", ".join(sorted(_recovered)), self.name)
+
+    # Applies configuration from chamber.ini. File is only parsed again when it has been modified.
+    def _readConf(self):
+        configs = _config.get()
+        config = configs.get(self.name) if configs is not None else None
 
-            if 'Chamber' in ini:
-                logger.debug("Reading Chamber config")
-        
-                config = ini['Chamber']
-                
-                try:
-                    if config["MessageLevel"] == "DEBUG":
-                        logger.setLevel(logging.DEBUG)
-                    elif config["MessageLevel"] == "WARNING":
-                        logger.setLevel(logging.WARNING)
-                    elif config["MessageLevel"] == "ERROR":
-                        logger.setLevel(logging.ERROR)
-                    elif config["MessageLevel"] == "INFO":
-                        logger.setLevel(logging.INFO)
-                    else:
-                        logger.setLevel(logging.INFO)
-                except KeyError:
-                    logger.setLevel(logging.INFO)
-                                    
-                # Read temperatures to target for each date
-                try:
-                    if config["Temps"] != "":
-                        self.targetTemps = []
-                        t = config["Temps"].split(",")
-                        for x in t:
-                            self.targetTemps.append(float(x))
-                    else:
-                        raise Exception
-                except:
-                    self.targetTemps = [DEFAULT_TEMP]
-                    logger.warning("Invalid temp values; using default: "+str(self.targetTemps[0]))
-
-                # Read dates when temperature should change
-                try:
-                    if config["Dates"] != "":
-                        self.tempDates = []
-                        dts = config["Dates"].split(",")
-                        for x in dts:
-                            self.tempDates.append(datetime.datetime.strptime(x, '%d/%m/%Y %H:%M:%S'))
-                    else:
-                        raise Exception
-                except:
-                    self.tempDates = [datetime.datetime.now(),datetime.datetime.now()]
-                    logger.warning("Invalid date values; using default. Heating/cooling will NOT start")
+        if config is None or config is self.config:
+            return
 
-        
-                if len(self.tempDates) != len(self.targetTemps)+1:
-                    self.tempDates = [datetime.datetime.now(),datetime.datetime.now()]
-                    self.targetTemps = [DEFAULT_TEMP]
-                    logger.warning("Invalid date or time values; using default. Heating/cooling will NOT start")
+        self.config = config
+        logger.setLevel(config.messageLevel)
+        self.targetTemps = list(config.targetTemps)
+        self.tempDates = list(config.tempDates)
+        self.schedule = schedule.Schedule(config.tempDates, config.targetTemps, config.rampTimes, config.rampShapes)
+        self.bufferBeerTemp = config.bufferBeerTemp
+        self.bufferChamberScale = config.bufferChamberScale
+        self.beerTAdjust = config.beerTAdjust
+        self.chamberTAdjust = config.chamberTAdjust
+        self.onDelay = config.onDelay
+        self.beerProbe = config.beerProbe
+        self.chamberProbe = config.chamberProbe
+        self.maxReadingAge = config.maxReadingAge
+        self.stalePolicy = config.stalePolicy
+        for _id, _bits in ((config.beerProbe, config.beerResolution), (config.chamberProbe, config.chamberResolution)):
+            if _id != "" and _bits is not None:
+                self.probes.setResolution(_id, _bits)
+        self.relays[HEAT].setWatts(config.heatWatts)
+        self.relays[COOL].setWatts(config.coolWatts)
+
+        # a schedule with a different first date is a new batch
+        if config.tempDates[0] != self.batchStart:
+            if self.batchStart is not None:
+                logger.info("New batch starting %s; duty cycle totals reset", config.tempDates[0].strftime("%d.%m.%Y %H:%M:%S"))
+                for r in self.relays.values():
+                    r.resetDuty()
+            self.batchStart = config.tempDates[0]
+        if config.tiltColor is not None:
+            self.tiltcolor = config.tiltColor
 
+        logger.debug("Chamber config updated")
 
-                try:
-                    if config["BeerTemperatureBuffer"] != "" and float(config["BeerTemperatureBuffer"]) >= 0.0:
-                        self.bufferBeerTemp = float(config.get("BeerTemperatureBuffer"))
-                    else:
-                        raise Exception
-                except:
-                    self.bufferBeerTemp = DEFAULT_BUFFER_BEER_TEMP
-                    logger.warning("Invalid beer temperature buffer in configuration; using default: "+str(self.bufferBeerTemp))
-
-                try:
-                    if config["ChamberScaleBuffer"] != "" and float(config["ChamberScaleBuffer"]) >= 0.0:
-                            self.bufferChamberScale = float(config.get("ChamberScaleBuffer"))
-                    else:
-                        raise Exception
-                except:
-                    self.bufferChamberScale = DEFAULT_BUFFER_CHAMBER_SCALE
-                    logger.warning("Invalid chamber scale buffer in configuration; using default: "+str(self.bufferChamberScale))
-
-                try:
-                    if config["BeerTempAdjust"] != "":
-                        self.beerTAdjust = float(config.get("BeerTempAdjust"))
-                    else:
-                        raise Exception
-                except:
-                    self.beerTAdjust = 0.0
-                    logger.warning("Invalid BeerTempAdjust in configuration; using default: "+str(self.beerTAdjust))
-
-                try:
-                    if config["ChamberTempAdjust"] != "":
-                        self.chamberTAdjust = float(config.get("ChamberTempAdjust"))
-                    else:
-                        raise Exception
-                except:
-                    self.chamberTAdjust = 0.0
-                    logger.warning("Invalid ChamberTempAdjust in configuration; using default: "+str(self.chamberTAdjust))
-
-                try:
-                    if config["OnDelay"] != "" and int(config["OnDelay"]) >= 0:
-                        self.onDelay = int(config.get("OnDelay"))*60
-                    else:
-                        raise Exception
-                except:
-                    self.onDelay = DEFAULT_ON_DELAY
-                    logger.warning("Invalid OnDelay in configuration; using default: "+str(self.onDelay)+" seconds")
+# returns None for temperatures that have not been read
+def _validTemp(_temp):
+    if _temp == DEFAULT_TEMP:
+        return None
+    return _temp
+
+# Immutable chamber configuration
+ChamberConfig = namedtuple('ChamberConfig', ['messageLevel', 'targetTemps', 'tempDates', 'bufferBeerTemp', 'bufferChamberScale', 'beerTAdjust', 'chamberTAdjust', 'onDelay', 'beerProbe', 'chamberProbe', 'rampTimes', 'rampShapes',
+    'heatRelayPin', 'heatLedPin', 'coolRelayPin', 'coolLedPin', 'tiltColor', 'maxReadingAge', 'stalePolicy', 'heatWatts', 'coolWatts', 'beerResolution', 'chamberResolution'])
+
+# returns names of configured chambers; first chamber first
+def getNames():
+    configs = _config.get()
+    if configs is None:
+        return [SECTION]
+    return list(configs.keys())
+
+# returns configuration of chamber with name; default configuration if the chamber is not configured
+def _sectionConf(_name):
+    configs = _config.get()
+    if configs is not None and _name in configs:
+        return configs[_name]
+    return _defaultConf()
+
+def _defaultConf():
+    return ChamberConfig(logging.INFO, (DEFAULT_TEMP,), (datetime.datetime.now(),datetime.datetime.now()), DEFAULT_BUFFER_BEER_TEMP, DEFAULT_BUFFER_CHAMBER_SCALE, 0.0, 0.0, DEFAULT_ON_DELAY, DEFAULT_BEER_PROBE, DEFAULT_CHAMBER_PROBE, (), (),
+        PIN_HEAT_RELAY, PIN_HEAT_LED, PIN_COOL_RELAY, PIN_COOL_LED, None, DEFAULT_MAX_READING_AGE, DEFAULT_STALE_POLICY, 0.0, 0.0, None, None)
+
+# Read class parameters from configuration ini file.
+# Format:
+# [Chamber]
+# MessageLevel = INFO
+# Temps = 18,21,0
+# Dates = 26/03/2019 12:00:00,28/09/2019 13:00:00,14/10/2019 14:00:00,20/04/2020 14:00:00
+# BeerTemperatureBuffer = 0.2
+# ChamberScaleBuffer = 5.0    
+#
+# Further chambers are configured in sections whose name starts with Chamber (e.g. [Chamber2]) using the same keys.
+# Returns dictionary of section name -> ChamberConfig; [Chamber] is always included.
+def _parseConf(ini):
+    configs = {}
+
+    if SECTION not in ini:
+        logger.warning("Problem read from configuration file: "+CONFIGFILE)
+        configs[SECTION] = _defaultConf()
+    else:
+        configs[SECTION] = _parseSection(ini[SECTION], SECTION)
+
+    for name in ini.sections():
+        if name != SECTION and name.startswith(SECTION):
+            config = _parseSection(ini[name], name)
+            if config is not None:
+                configs[name] = config
+
+    return configs
+
+# returns configuration of chamber in section; None if a further chamber is missing its pins
+def _parseSection(config, _name):
+
+    logger.debug("Reading Chamber config: "+_name)
+    primary = _name == SECTION
+
+    # Read temperatures to target for each date
+    try:
+        if config["Temps"] != "":
+            targetTemps = []
+            t = config["Temps"].split(",")
+            for x in t:
+                targetTemps.append(float(x))
+        else:
+            raise Exception
+    except:
+        targetTemps = [DEFAULT_TEMP]
+        logger.warning("Invalid temp values; using default: "+str(targetTemps[0]))
+
+    # Read dates when temperature should change
+    try:
+        if config["Dates"] != "":
+            tempDates = []
+            dts = config["Dates"].split(",")
+            for x in dts:
+                tempDates.append(datetime.datetime.strptime(x, '%d/%m/%Y %H:%M:%S'))
+        else:
+            raise Exception
+    except:
+        tempDates = [datetime.datetime.now(),datetime.datetime.now()]
+        logger.warning("Invalid date values; using default. Heating/cooling will NOT start")
+
+    if len(tempDates) != len(targetTemps)+1:
+        tempDates = [datetime.datetime.now(),datetime.datetime.now()]
+        targetTemps = [DEFAULT_TEMP]
+        logger.warning("Invalid date or time values; using default. Heating/cooling will NOT start")
+
+    try:
+        if config["BeerTemperatureBuffer"] != "" and float(config["BeerTemperatureBuffer"]) >= 0.0:
+            bufferBeerTemp = float(config.get("BeerTemperatureBuffer"))
+        else:
+            raise Exception
+    except:
+        bufferBeerTemp = DEFAULT_BUFFER_BEER_TEMP
+        logger.warning("Invalid beer temperature buffer in configuration; using default: "+str(bufferBeerTemp))
+
+    try:
+        if config["ChamberScaleBuffer"] != "" and float(config["ChamberScaleBuffer"]) >= 0.0:
+                bufferChamberScale = float(config.get("ChamberScaleBuffer"))
+        else:
+            raise Exception
+    except:
+        bufferChamberScale = DEFAULT_BUFFER_CHAMBER_SCALE
+        logger.warning("Invalid chamber scale buffer in configuration; using default: "+str(bufferChamberScale))
+
+    try:
+        if config["BeerTempAdjust"] != "":
+            beerTAdjust = float(config.get("BeerTempAdjust"))
+        else:
+            raise Exception
+    except:
+        beerTAdjust = 0.0
+        logger.warning("Invalid BeerTempAdjust in configuration; using default: "+str(beerTAdjust))
+
+    try:
+        if config["ChamberTempAdjust"] != "":
+            chamberTAdjust = float(config.get("ChamberTempAdjust"))
+        else:
+            raise Exception
+    except:
+        chamberTAdjust = 0.0
+        logger.warning("Invalid ChamberTempAdjust in configuration; using default: "+str(chamberTAdjust))
+
+    try:
+        if config["OnDelay"] != "" and int(config["OnDelay"]) >= 0:
+            onDelay = int(config.get("OnDelay"))*60
+        else:
+            raise Exception
+    except:
+        onDelay = DEFAULT_ON_DELAY
+        logger.warning("Invalid OnDelay in configuration; using default: "+str(onDelay)+" seconds")
+
+    # ids of probes as found in /sys/bus/w1/devices; probes found on the bus are logged when fermonitor starts.
+    # Only the first chamber has default probes; further chambers without probe do not heat or cool.
+    beerProbe = config.get("BeerProbe", "").strip()
+    if beerProbe == "":
+        beerProbe = DEFAULT_BEER_PROBE if primary else ""
+        logger.warning("Invalid BeerProbe in configuration of "+_name+"; using default: "+beerProbe)
+
+    chamberProbe = config.get("ChamberProbe", "").strip()
+    if chamberProbe == "":
+        chamberProbe = DEFAULT_CHAMBER_PROBE if primary else ""
+        logger.warning("Invalid ChamberProbe in configuration of "+_name+"; using default: "+chamberProbe)
+
+    # Ramp from previous target to each target in hours and its shape; values separated by ","
+    rampTimes = []
+    try:
+        if config.get("RampHours", "") != "":
+            for x in config["RampHours"].split(","):
+                if float(x) < 0.0:
+                    raise Exception
+                rampTimes.append(datetime.timedelta(hours=float(x)))
+    except:
+        rampTimes = []
+        logger.warning("Invalid RampHours in configuration; temperatures change in steps")
+
+    rampShapes = []
+    for x in config.get("RampShapes", "").split(","):
+        if x.strip().upper() in (schedule.STEP, schedule.LINEAR, schedule.EXPONENTIAL):
+            rampShapes.append(x.strip().upper())
+        elif x.strip() != "":
+            rampShapes.append(schedule.LINEAR)
+            logger.warning("Invalid RampShapes value "+x+"; using default: "+schedule.LINEAR)
+
+    # GPIO pins (BCM numbering) of relays and their LEDs; only the first chamber has default pins
+    pins = []
+    for key, default in (("HeatRelayPin", PIN_HEAT_RELAY), ("HeatLedPin", PIN_HEAT_LED), ("CoolRelayPin", PIN_COOL_RELAY), ("CoolLedPin", PIN_COOL_LED)):
+        try:
+            if config.get(key, "") != "" and int(config[key]) >= 0:
+                pins.append(int(config[key]))
+            elif primary:
+                pins.append(default)
+            else:
+                raise Exception
+        except:
+            if not primary:
+                logger.error("Invalid "+key+" in configuration of "+_name+"; chamber is not controlled")
+                return None
+            pins.append(default)
+            logger.warning("Invalid "+key+" in configuration; using default: "+str(default))
+
+    # color of Tilt measuring beer temperature; if not set the color selected in fermonitor.ini is used
+    tiltColor = config.get("TiltColor", "").strip().upper()
+    if tiltColor == "":
+        tiltColor = None
+    elif not tilt.validColor(tiltColor):
+        logger.warning("Invalid TiltColor in configuration of "+_name+": "+tiltColor)
+        tiltColor = None
+
+    # seconds after which a probe reading is stale and what to do then
+    try:
+        if config.get("MaxReadingAge", "") != "" and float(config["MaxReadingAge"]) > 0.0:
+            maxReadingAge = float(config["MaxReadingAge"])
+        elif config.get("MaxReadingAge", "") == "":
+            maxReadingAge = DEFAULT_MAX_READING_AGE
+        else:
+            raise Exception
+    except:
+        maxReadingAge = DEFAULT_MAX_READING_AGE
+        logger.warning("Invalid MaxReadingAge in configuration; using default: "+str(maxReadingAge))
+
+    stalePolicy = config.get("StalePolicy", DEFAULT_STALE_POLICY).strip().upper()
+    if stalePolicy not in (STALE_HOLD, STALE_FALLBACK, STALE_OFF):
+        logger.warning("Invalid StalePolicy in configuration; using default: "+DEFAULT_STALE_POLICY)
+        stalePolicy = DEFAULT_STALE_POLICY
+
+    # power of heating and cooling device in watts for energy accounting; 0 if unknown
+    watts = []
+    for key in ("HeatWatts", "CoolWatts"):
+        try:
+            if config.get(key, "") == "":
+                watts.append(0.0)
+            elif float(config[key]) >= 0.0:
+                watts.append(float(config[key]))
+            else:
+                raise Exception
+        except:
+            watts.append(0.0)
+            logger.warning("Invalid "+key+" in configuration; energy is not reported")
 
+    # resolution of probes in bits (9-12); None keeps the resolution the probe has
+    resolutions = []
+    for key in ("BeerProbeResolution", "ChamberProbeResolution"):
+        try:
+            if config.get(key, "") == "":
+                resolutions.append(None)
+            elif int(config[key]) in onewire.CONVERSION_TIMES:
+                resolutions.append(int(config[key]))
+            else:
+                raise Exception
         except:
-            logger.warning("Problem read from configuration file: "+CONFIGFILE)
-       
-            
-        logger.debug("Chamber config updated")
+            resolutions.append(None)
+            logger.warning("Invalid "+key+" in configuration; resolution of probe is not changed")
+
+    return ChamberConfig(configcache.messageLevel(config), tuple(targetTemps), tuple(tempDates), bufferBeerTemp, bufferChamberScale, beerTAdjust, chamberTAdjust, onDelay, beerProbe, chamberProbe, tuple(rampTimes), tuple(rampShapes),
+        pins[0], pins[1], pins[2], pins[3], tiltColor, maxReadingAge, stalePolicy, watts[0], watts[1], resolutions[0], resolutions[1])
+
+_config = configcache.register(CONFIGFILE, _parseConf)
 
+# callback is called with the configurations of all chambers whenever chamber.ini is reloaded
+def subscribeConfig(_callback):
+    _config.subscribe(_callback)
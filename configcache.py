@@ -0,0 +1,129 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import time
+import threading
+import logging
+import configparser
+
+logger = logging.getLogger('FERMONITOR.CONFIGCACHE')
+logger.setLevel(logging.INFO)
+
+CHECK_INTERVAL = 1.0    # minimum seconds between checks of a file's modification time
+
+_files = {}
+_filesLock = threading.Lock()
+
+# returns the shared ConfigFile for filename; parser is only used when the file is registered the first time
+def register(_filename, _parser):
+    with _filesLock:
+        if _filename not in _files:
+            _files[_filename] = ConfigFile(_filename, _parser)
+        return _files[_filename]
+
+# converts MessageLevel value of a configuration section to logging level
+def messageLevel(_config):
+    try:
+        return {"DEBUG": logging.DEBUG, "WARNING": logging.WARNING, "ERROR": logging.ERROR, "INFO": logging.INFO}.get(_config["MessageLevel"], logging.INFO)
+    except KeyError:
+        return logging.INFO
+
+# Configuration file that is only parsed when its modification time or size changes. The parser turns the
+# ConfigParser into an immutable, validated configuration object (e.g. namedtuple) which is shared by all users of the
+# file. Checking for changes costs a single stat() call at most once per CHECK_INTERVAL.
+class ConfigFile:
+
+    def __init__(self, _filename, _parser):
+        self.filename = _filename
+        self.parser = _parser
+        self.lock = threading.Lock()
+        self.config = None
+        self.version = 0
+        self.signature = None
+        self.nextCheck = 0.0
+        self.subscribers = []
+
+    # returns latest parsed configuration or None if the file has never been parsed successfully
+    def get(self):
+        now = time.monotonic()
+        if now < self.nextCheck:
+            return self.config
+
+        callbacks = []
+        with self.lock:
+            if now >= self.nextCheck:
+                self.nextCheck = now + CHECK_INTERVAL
+                if self._reload():
+                    callbacks = list(self.subscribers)
+            config = self.config
+
+        for callback in callbacks:
+            try:
+                callback(config)
+            except Exception:
+                logger.exception("Subscriber failed handling reload of: "+self.filename)
+
+        return config
+
+    # number of times configuration was reloaded; changes whenever get() returns a new object
+    def getVersion(self):
+        return self.version
+
+    # callback is called with new configuration object whenever file is reloaded
+    def subscribe(self, _callback):
+        with self.lock:
+            self.subscribers.append(_callback)
+
+    # parses file if it changed since last check; returns True if configuration was replaced
+    def _reload(self):
+        try:
+            st = os.stat(self.filename)
+            signature = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            signature = None
+
+        if signature == self.signature and self.version > 0:
+            return False
+
+        self.signature = signature
+
+        # a file that is missing for a moment (e.g. editor replacing it) must not reset settings to defaults; defaults
+        # are only used if the file was never read
+        if signature is None:
+            if self.version > 0:
+                logger.warning("Configuration file missing; keeping previous configuration: "+self.filename)
+                return False
+            logger.error("Configuration file is not valid: "+self.filename)
+
+        ini = configparser.ConfigParser()
+        try:
+            if signature is not None:
+                ini.read(self.filename)
+            config = self.parser(ini)
+        except Exception:
+            logger.exception("Problem reading configuration file: "+self.filename)
+            return False
+
+        logger.debug("Reloaded configuration file: "+self.filename)
+        self.config = config
+        self.version += 1
+        return True
@@ -0,0 +1,177 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import time
+
+# Rolling windows duty cycle is reported for: name -> (seconds, buckets)
+HOUR = "1h"
+DAY = "24h"
+WINDOWS = ((HOUR, 3600, 60), (DAY, 86400, 96))
+
+# Sum of on and total seconds over the latest seconds of time. Time is split into buckets kept in a ring; running sums
+# are adjusted when seconds are added or a bucket drops out, so adding and reading cost O(1) (amortized over the
+# buckets skipped). The window slides by one bucket at a time.
+class RollingWindow:
+
+    def __init__(self, _seconds, _buckets):
+        self.width = _seconds / _buckets
+        self.onBuckets = [0.0] * _buckets
+        self.totalBuckets = [0.0] * _buckets
+        self.latest = None          # number of latest bucket since epoch of clock
+        self.onSum = 0.0
+        self.totalSum = 0.0
+
+    # adds interval of seconds ending at time; on tells if the relay was on during the interval. The interval is split
+    # over the buckets it covers; time before the window is dropped.
+    def add(self, _time, _seconds, _on):
+        self._advance(_time)
+        end = _time
+        bucket = int(_time // self.width)
+        while _seconds > 0 and bucket > self.latest - len(self.totalBuckets):
+            part = min(_seconds, end - bucket * self.width)
+            slot = bucket % len(self.totalBuckets)
+            self.totalBuckets[slot] += part
+            self.totalSum += part
+            if _on:
+                self.onBuckets[slot] += part
+                self.onSum += part
+            _seconds -= part
+            end -= part
+            bucket -= 1
+
+    # returns (on seconds, total seconds) within window ending at time
+    def get(self, _time):
+        self._advance(_time)
+        return max(self.onSum, 0.0), max(self.totalSum, 0.0)
+
+    # drops buckets older than the window ending at time
+    def _advance(self, _time):
+        bucket = int(_time // self.width)
+        if self.latest is None:
+            self.latest = bucket
+            return
+
+        steps = min(bucket - self.latest, len(self.totalBuckets))
+        for i in range(1, steps + 1):
+            slot = (self.latest + i) % len(self.totalBuckets)
+            self.onSum -= self.onBuckets[slot]
+            self.totalSum -= self.totalBuckets[slot]
+            self.onBuckets[slot] = 0.0
+            self.totalBuckets[slot] = 0.0
+        if bucket > self.latest:
+            self.latest = bucket
+
+# Streaming on-time accounting of a relay. update() is called with the relay state every control cycle; the time since
+# the previous call is booked as on or off time. Besides the rolling windows lifetime totals are kept, which are reset
+# for a new batch and can be saved and restored across restarts. Energy follows from on-time and configured wattage.
+class DutyCycle:
+
+    def __init__(self, _clock=time.monotonic):
+        self.clock = _clock
+        self.state = None
+        self.lastTime = None
+        self.since = None           # start of current on or off period; None if it started before accounting
+        self.windows = {name: RollingWindow(seconds, buckets) for name, seconds, buckets in WINDOWS}
+        self.reset()
+
+    # clears lifetime totals, e.g. when a new batch starts
+    def reset(self):
+        self.onSeconds = 0.0
+        self.totalSeconds = 0.0
+        self.cycles = 0
+        self.onPeriods = 0
+        self.onPeriodSeconds = 0.0
+        self.offPeriods = 0
+        self.offPeriodSeconds = 0.0
+
+    def update(self, _on, _time=None):
+        if _time is None:
+            _time = self.clock()
+
+        if self.lastTime is not None and _time > self.lastTime:
+            elapsed = _time - self.lastTime
+            self.totalSeconds += elapsed
+            if self.state:
+                self.onSeconds += elapsed
+            for window in self.windows.values():
+                window.add(_time, elapsed, self.state)
+
+        if _on != self.state:
+            if self.state is not None and self.since is not None:
+                if self.state:
+                    self.onPeriods += 1
+                    self.onPeriodSeconds += _time - self.since
+                else:
+                    self.offPeriods += 1
+                    self.offPeriodSeconds += _time - self.since
+            self.since = _time if self.state is not None else None
+            if _on:
+                self.cycles += 1
+            self.state = _on
+
+        self.lastTime = _time
+
+    # returns on-time, cycles, average on/off period and duty cycle (fraction of time on) of lifetime and each window.
+    # Energy in kWh is included if wattage of the device is known (> 0).
+    def getStats(self, _watts=0.0):
+        current = self.clock()
+        stats = {
+            "onSeconds": round(self.onSeconds, 1),
+            "cycles": self.cycles,
+            "avgOnDuration": round(self.onPeriodSeconds / self.onPeriods, 1) if self.onPeriods > 0 else None,
+            "avgOffDuration": round(self.offPeriodSeconds / self.offPeriods, 1) if self.offPeriods > 0 else None,
+            "dutyCycle": round(self.onSeconds / self.totalSeconds, 4) if self.totalSeconds > 0 else None}
+        if _watts > 0:
+            stats["kWh"] = round(self.onSeconds * _watts / 3600000, 3)
+
+        for name, window in self.windows.items():
+            on, total = window.get(current)
+            stats["dutyCycle" + name] = round(on / total, 4) if total > 0 else None
+            if _watts > 0:
+                stats["kWh" + name] = round(on * _watts / 3600000, 3)
+        return stats
+
+    # returns lifetime totals to be saved for a restart
+    def getCheckpoint(self):
+        return {
+            "onSeconds": self.onSeconds,
+            "totalSeconds": self.totalSeconds,
+            "cycles": self.cycles,
+            "onPeriods": self.onPeriods,
+            "onPeriodSeconds": self.onPeriodSeconds,
+            "offPeriods": self.offPeriods,
+            "offPeriodSeconds": self.offPeriodSeconds}
+
+    # adds lifetime totals saved by getCheckpoint(); time while not running is not accounted
+    def restore(self, _data):
+        if not isinstance(_data, dict):
+            return
+        try:
+            self.onSeconds += float(_data.get("onSeconds", 0.0))
+            self.totalSeconds += float(_data.get("totalSeconds", 0.0))
+            self.cycles += int(_data.get("cycles", 0))
+            self.onPeriods += int(_data.get("onPeriods", 0))
+            self.onPeriodSeconds += float(_data.get("onPeriodSeconds", 0.0))
+            self.offPeriods += int(_data.get("offPeriods", 0))
+            self.offPeriodSeconds += float(_data.get("offPeriodSeconds", 0.0))
+        except (TypeError, ValueError):
+            pass
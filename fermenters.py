@@ -0,0 +1,112 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import time
+import threading
+import logging
+
+import chamber
+import onewire
+
+logger = logging.getLogger('FERMONITOR.FERMENTERS')
+logger.setLevel(logging.INFO)
+
+# Controls all chambers configured in chamber.ini from a single thread. Probes of all chambers are sampled by one
+# shared probe registry, so each bus is converted once per interval no matter how many chambers read from it, and a
+# chamber only costs one evaluation per cycle. Chambers are created when fermonitor starts; sections added to
+# chamber.ini later require a restart while their other settings are applied while running.
+class Fermenters(threading.Thread):
+
+    def __init__(self, _tilt, _bus=None, _interval=None):
+        threading.Thread.__init__(self)
+
+        self.stopThread = True
+        self.interval = _interval          # seconds between cycles; None follows conversion time of the probes
+        self.probes = onewire.ProbeRegistry()
+        self.chambers = []
+        self.failing = set()                # names of chambers whose latest cycle failed; logged once per failure
+
+        pins = set()
+        for name in chamber.getNames():
+            c = chamber.Chamber(_tilt, _bus, name, self.probes)
+
+            # two chambers switching the same relay would fight over it
+            used = pins.intersection(r.relayPin for r in c.relays.values())
+            if len(used) > 0:
+                logger.error("Relay pins of "+name+" already used by another chamber: "+str(sorted(used))+"; chamber is not controlled")
+                continue
+
+            pins.update(r.relayPin for r in c.relays.values())
+            self.chambers.append(c)
+            logger.info("Controlling chamber: "+name)
+
+    # Starts the background thread
+    def run(self):
+        logger.info("Starting Fermenters")
+        self.stopThread = False
+        self.probes.start()
+
+        while self.stopThread != True:
+            for c in self.chambers:
+                try:
+                    c.step()
+                except Exception:
+                    if c.name not in self.failing:
+                        logger.exception("Problem controlling chamber: "+c.name)
+                        self.failing.add(c.name)
+                    continue
+                if c.name in self.failing:
+                    logger.info("Controlling chamber again: "+c.name)
+                    self.failing.discard(c.name)
+            time.sleep(self.getInterval())
+
+        self.probes.stop()
+
+        for c in self.chambers:
+            c.shutdown()
+        logger.info("Fermenters Stopped")
+
+    def stop(self):
+        self.stopThread = True
+
+    # a cycle is due as soon as the chamber with the fastest probes can have new readings
+    def getInterval(self):
+        if self.interval is not None:
+            return self.interval
+        if len(self.chambers) == 0:
+            return chamber.UPDATE_INVERVAL
+        return min(c.getInterval() for c in self.chambers)
+
+    # returns the chamber configured in section [Chamber]
+    def getChamber(self):
+        return self.chambers[0] if len(self.chambers) > 0 else None
+
+    def getChambers(self):
+        return list(self.chambers)
+
+    # returns chamber name -> relay statistics
+    def getRelayStats(self):
+        return {c.name: c.getRelayStats() for c in self.chambers}
+
+    # probes are shared so their statistics are not repeated per chamber
+    def getProbeStats(self):
+        return self.probes.getStats()
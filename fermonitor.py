@@ -21,152 +21,385 @@
 # SOFTWARE.
 
 import sys
-import datetime
+import json
 import time
-import os
-import configparser
-import threading
+import queue
 import logging
-from logging.handlers import TimedRotatingFileHandler
+from collections import namedtuple
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
 from distutils.util import strtobool
-from flask import Flask, render_template                                                         
-from influxdb import InfluxDBClient
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g                                                         
 
 import chamber
+import fermenters
 import interface
 import tilt
 import brewfather
+import sensorbus
+import configcache
+import pointfilter
+import lineprotocol
+import history
+import webstate
+import webserver
+import statefile
+
+# InfluxDB client is only needed when points are written to InfluxDB
+try:
+    import influxwriter
+except ImportError:
+    influxwriter = None
 
 CONFIGFILE = "fermonitor.ini"
 
 CONTROL_TILT = 0
 CONTROL_WIRE = 1
 
-cTilt = None
-cChamber = None
-cBrewfather = None
+DEFAULT_MEASUREMENT = "fermonitor"
 
-def read_settings():
-    global sTiltColor
-    global chamberControlTemp
-    global logLevel
+# InfluxDB type of each field written; checked against the measurement when writing starts
+FIELD_TYPES = {
+    "targetTemp": "float", "chamberTemp": "float", "beerTemp": "float", "tiltTemp": "float", "gravity": "float",
+    "heating": "boolean", "cooling": "boolean", "tiltControlled": "boolean",
+    "heatingDuty": "float", "coolingDuty": "float", "heatingEnergy": "float", "coolingEnergy": "float"}
 
-    sTiltColor = None
-    chamberControlTemp = CONTROL_WIRE
-    logLevel = logging.INFO
-    
-    logger.debug("Reading configfile: "+ CONFIGFILE)
+# Where readings are stored
+STORAGE_INFLUXDB = "INFLUXDB"
+STORAGE_LOCAL = "LOCAL"
+STORAGE_BOTH = "BOTH"
 
-    try:
-        if os.path.isfile(CONFIGFILE) == False:
-            raise Exception
-    
-        ini = configparser.ConfigParser()
-        ini.read(CONFIGFILE)
-    except:
-        raise IOError("Fermonitor configuration file is not valid: "+CONFIGFILE)
+SETTINGS_INTERVAL = 5           # seconds between checks of configuration
+INTERFACE_MIN_INTERVAL = 0.5    # fastest rate LCD is updated with new data
+INTERFACE_MAX_INTERVAL = 5      # LCD clears data not refreshed within 15s so data is re-sent even without change
+BREWFATHER_MIN_INTERVAL = 10    # BrewFather only sends data every 15min so no need to pass it every change
+STORE_MIN_INTERVAL = 0.5        # fastest rate points are written to InfluxDB and local history
+STORE_MAX_INTERVAL = 10         # data is re-sent so deadband filter can write heartbeat points
+WEB_MIN_INTERVAL = 1            # fastest rate web streams are woken for changes
+STREAM_KEEPALIVE = 15           # seconds between checks/keep-alive comments on event streams
+
+cTilt = None
+cChamber = None         # chamber configured in [Chamber]; data of further chambers is only shown in the web API
+cFermenters = None
+cBrewfather = None
+cInfluxWriter = None
+cHistory = None
+cInterface = None
+cBus = None
+cWebServer = None
+cStateFile = None
+cRelayStates = None     # heating and cooling of each chamber at latest checkpoint
+cPointFilter = pointfilter.DeadbandFilter()
+cPointEncoder = None
+cWebState = webstate.WebState()
+cRenderCache = webstate.RenderCache()
+cRequestStats = webserver.RequestStats()
+
+sTiltColor = None
+chamberControlTemp = CONTROL_WIRE
+logLevel = logging.INFO
+_settings = None
+
+# Immutable Fermonitor configuration
+FermonitorConfig = namedtuple('FermonitorConfig', ['messageLevel', 'tiltColor', 'chamberControl', 'measurement', 'heartbeat', 'deadbands', 'storage', 'historyFile', 'retention', 'web', 'stateFile'])
+
+def _parseSettings(ini):
+    logger.debug("Reading configfile: "+ CONFIGFILE)
 
     try:
         config = ini['Fermonitor']
     except:
         raise IOError("[Fermonitor] section not found in fermonitor.ini")
 
-    try:
-        if config["MessageLevel"] == "DEBUG":
-            logLevel = logging.DEBUG
-        elif config["MessageLevel"] == "WARNING":
-            logLevel = logging.WARNING
-        elif config["MessageLevel"] == "ERROR":
-            logLevel = logging.ERROR
-        elif config["MessageLevel"] == "INFO":
-            logLevel = logging.INFO
-        else:
-            logLevel = logging.INFO
-    except KeyError:
-        logLevel = logging.INFO
-
-    logger.setLevel(logLevel)   
+    level = configcache.messageLevel(config)
 
     try:
         if config["TiltColor"] != "":
-            sTiltColor = config.get("TiltColor")
+            tiltColor = config.get("TiltColor")
         else:
             raise Exception
     except:
         logger.warning("No color specified for Tilt. Tilt not used.")
-        sTiltColor = None
+        tiltColor = None
 
-    logger.debug("Tilt color: "+ sTiltColor)    
+    logger.debug("Tilt color: "+ str(tiltColor))    
 
     try:
         if config["ChamberControl"] != "":
             if config.get("ChamberControl") == "WIRE":
-                chamberControlTemp = CONTROL_WIRE
+                chamberControl = CONTROL_WIRE
                 logger.debug("Chamber control temperature based on WIRE")    
             elif config.get("ChamberControl") == "TILT":
-                chamberControlTemp = CONTROL_TILT
+                chamberControl = CONTROL_TILT
                 logger.debug("Chamber control temperature based on TILT")    
             else:
-                chamberControlTemp = CONTROL_WIRE
+                chamberControl = CONTROL_WIRE
                 logger.warning("Invalid ChamberControl configuration; using default: WIRE")
         else:
-            chamberControlTemp = CONTROL_WIRE
+            chamberControl = CONTROL_WIRE
             logger.warning("Invalid ChamberControl configuration; using default: WIRE")
     except:
-        chamberControlTemp = CONTROL_WIRE
+        chamberControl = CONTROL_WIRE
         logger.warning("Invalid ChamberControl configuration; using default: WIRE")
 
+    measurement = DEFAULT_MEASUREMENT
     try:
-        if config["MessageLevel"] == "DEBUG":
-            logLevel = logging.DEBUG
-        elif config["MessageLevel"] == "WARNING":
-            logLevel = logging.WARNING
-        elif config["MessageLevel"] == "ERROR":
-            logLevel = logging.ERROR
-        elif config["MessageLevel"] == "INFO":
-            logLevel = logging.INFO
+        if ini['InfluxDB']["Measurement"] != "":
+            measurement = ini['InfluxDB']["Measurement"]
         else:
-            logLevel = logging.INFO
-    except KeyError:
-        logLevel = logging.INFO
+            raise Exception
+    except:
+        logger.warning("Invalid InfluxDB Measurement configuration; using default: "+measurement)
 
-    logger.setLevel(logLevel)   
+    heartbeat = pointfilter.DEFAULT_HEARTBEAT
+    try:
+        if ini['InfluxDB']["HeartbeatSeconds"] != "" and int(ini['InfluxDB']["HeartbeatSeconds"]) > 0:
+            heartbeat = int(ini['InfluxDB']["HeartbeatSeconds"])
+        else:
+            raise Exception
+    except:
+        logger.warning("Invalid InfluxDB HeartbeatSeconds configuration; using default: "+str(heartbeat))
+
+    # field name -> minimum change before new point is written
+    deadbands = []
+    if 'Deadband' in ini:
+        for name, value in ini['Deadband'].items():
+            try:
+                if float(value) >= 0.0:
+                    deadbands.append((name, float(value)))
+                else:
+                    raise Exception
+            except:
+                logger.warning("Invalid deadband for field "+name+"; field written on every change")
+
+    storage = STORAGE_INFLUXDB
+    historyFile = history.DATABASE
+    stateFile = statefile.STATEFILE
+    retention = []
+    if 'Storage' in ini:
+        config = ini['Storage']
+
+        if config.get("Backend", STORAGE_INFLUXDB) in (STORAGE_INFLUXDB, STORAGE_LOCAL, STORAGE_BOTH):
+            storage = config.get("Backend", STORAGE_INFLUXDB)
+        else:
+            logger.warning("Invalid Storage Backend configuration; using default: "+storage)
+
+        if config.get("Database", "") != "":
+            historyFile = config.get("Database")
+
+        if config.get("StateFile", "") != "":
+            stateFile = config.get("StateFile")
+
+        for key, resolution in (("RawDays", history.RAW), ("MinuteDays", history.MINUTE), ("QuarterHourDays", history.QUARTER)):
+            try:
+                if key in config:
+                    if int(config[key]) > 0:
+                        retention.append((resolution, int(config[key])))
+                    else:
+                        raise Exception
+            except:
+                logger.warning("Invalid Storage "+key+" configuration; using default: "+str(history.DEFAULT_RETENTION[resolution]))
 
     logger.debug("Completed reading settings")    
+    return FermonitorConfig(level, tiltColor, chamberControl, measurement, heartbeat, tuple(deadbands), storage, historyFile, tuple(retention), webserver.parseConfig(ini), stateFile)
+
+_config = configcache.register(CONFIGFILE, _parseSettings)
+
+# Applies settings of fermonitor.ini. File is only parsed again when it has been modified.
+def read_settings():
+    global sTiltColor
+    global chamberControlTemp
+    global logLevel
+    global _settings
+
+    config = _config.get()
+    if config is None:
+        raise IOError("Fermonitor configuration file is not valid: "+CONFIGFILE)
+
+    _settings = config
+    sTiltColor = config.tiltColor
+    chamberControlTemp = config.chamberControl
+    logLevel = config.messageLevel
+
+    logger.setLevel(logLevel)   
     return
 
 
+################################################################
+# Sensor bus consumers. Each receives a dictionary with the latest data published for the topics it subscribed to.
+
+# returns Tilt temperature and gravity for configured color from published Tilt data
+def _tiltReadings(_data):
+    _tiltdata = None
+    if sTiltColor is not None and _data.get(sensorbus.TOPIC_TILT) is not None:
+        _tiltdata = _data[sensorbus.TOPIC_TILT].get(sTiltColor)
+
+    if _tiltdata is None:
+        return None, None
+    return _tiltdata.get(tilt.TEMP), _tiltdata.get(tilt.SG)
+
+def _updateInterface(_data):
+    _state = _data.get(sensorbus.TOPIC_CHAMBER, chamber.EMPTY_STATE)
+    _tBeerT, _tBeerSG = _tiltReadings(_data)
+
+    cInterface.setData( \
+        _state.targetTemp, \
+        _state.wireBeerTemp, \
+        _state.chamberTemp, \
+        _tBeerSG, \
+        _tBeerT, \
+        _state.tiltControlled)
+
+def _updateBrewfather(_data):
+    _state = _data.get(sensorbus.TOPIC_CHAMBER, chamber.EMPTY_STATE)
+    _tBeerT, _tBeerSG = _tiltReadings(_data)
+
+    cBrewfather.setData(_state.beerTemp, _state.chamberTemp, _tBeerSG)
+
+# saves state soon after any relay of a chamber changed so on delay survives a crash right after the change
+def _checkpointRelays(_data):
+    global cRelayStates
+
+    _states = tuple((_topic, _state.heating, _state.cooling) for _topic, _state in sorted(_data.items()))
+    if _states != cRelayStates:
+        cRelayStates = _states
+        cStateFile.checkpoint()
+
+# writes readings to InfluxDB and/or the local history store
+def _storeData(_data):
+    global cPointEncoder
+
+    _state = _data.get(sensorbus.TOPIC_CHAMBER, chamber.EMPTY_STATE)
+    _tBeerT, _tBeerSG = _tiltReadings(_data)
+
+    _cTargetT = _state.targetTemp
+    _cChamberT = _state.chamberTemp
+    _cWireBeerT = _state.wireBeerTemp
+
+    _values = {}
+
+    if _cTargetT is not None:
+        _values["targetTemp"] = round(float(_cTargetT),1)
+    if _cChamberT is not None:
+        _values["chamberTemp"] = round(float(_cChamberT),1)
+    if _cWireBeerT is not None:
+        _values["beerTemp"] = round(float(_cWireBeerT),1)
+    if _tBeerT is not None:
+        _values["tiltTemp"] = round(float(_tBeerT),1)
+    if _tBeerSG is not None:
+        _values["gravity"] = round(float(_tBeerSG),3)
+    _values["heating"] = _state.heating
+    _values["cooling"] = _state.cooling
+    _values["tiltControlled"] = _state.tiltControlled
+
+    # duty cycle of last hour and energy of batch; kept up to date by the relays so nothing is recomputed here
+    if cChamber is not None:
+        for _name, _duty in cChamber.getDutyStats().items():
+            if _duty.get("dutyCycle1h") is not None:
+                _values[_name+"Duty"] = round(_duty["dutyCycle1h"],2)
+            if _duty.get("kWh") is not None:
+                _values[_name+"Energy"] = round(_duty["kWh"],2)
+
+    # only write point when values moved outside their deadband, a relay switched or heartbeat expired
+    cPointFilter.setDeadbands(dict(_settings.deadbands))
+    cPointFilter.setHeartbeat(_settings.heartbeat)
+    if not cPointFilter.accept(_values):
+        return
+
+    if cHistory is not None:
+        cHistory.write(_values)
+
+    if cInfluxWriter is not None:
+        if cPointEncoder is None or cPointEncoder.measurement != _settings.measurement:
+            cPointEncoder = lineprotocol.PointEncoder(_settings.measurement)
+            cInfluxWriter.checkFieldTypes(_settings.measurement, FIELD_TYPES)
+
+        cInfluxWriter.write(cPointEncoder.encode(_values))
+
+
 ################################################################
 def main():
     
     global cTilt
     global cChamber
+    global cFermenters
     global cBrewfather
+    global cInfluxWriter
+    global cHistory
+    global cInterface
+    global cBus
+    global cWebServer
+    global cStateFile
     
     logger.info("Starting Fermonitor...")
 
     read_settings()
 
+    # State saved by the previous run is restored before threads start so on delay timers are honoured at once
+    cStateFile = statefile.StateFile(_settings.stateFile)
+
+    # Sensors publish new readings to the bus which delivers them to the consumers
+    cBus = sensorbus.SensorBus()
+    cBus.start()
+
     cInterface = interface.Interface("Fermonitor......")
     cInterface.setLogLevel(logLevel)
     cInterface.start()
 
-    cTilt = tilt.Tilt()
+    cTilt = tilt.Tilt(cBus)
+    cTilt.restore(cStateFile.restore(sensorbus.TOPIC_TILT))
+    cStateFile.register(sensorbus.TOPIC_TILT, cTilt.getCheckpoint)
     cTilt.start()
 
-    cChamber = chamber.Chamber(cTilt)
-    cChamber.start()
+    # all chambers in chamber.ini are controlled by one thread sharing the probe sampling
+    cFermenters = fermenters.Fermenters(cTilt, cBus)
+    cChamber = cFermenters.getChamber()
+    for _chamber in cFermenters.getChambers():
+        _chamber.restore(cStateFile.restore(_chamber.topic))
+        cStateFile.register(_chamber.topic, _chamber.getCheckpoint)
+    cFermenters.start()
 
     # Start BrewFather thread to store temp and gravity
     logger.debug("Starting BrewFather Thread")
     cBrewfather = brewfather.BrewFather()
+    cBrewfather.restore(cStateFile.restore("brewfather"))
+    cStateFile.register("brewfather", cBrewfather.getCheckpoint)
     cBrewfather.start()
 
-    client = InfluxDBClient(host='localhost', port=8086)
-    client.create_database('brewing')
-    client.switch_database('brewing')
+    cStateFile.start()
 
-    # Main loop for reading and logging data as well as controllng fermentor
+    # Start InfluxDB writer thread so writes never block the main loop
+    if _settings.storage in (STORAGE_INFLUXDB, STORAGE_BOTH):
+        if influxwriter is None:
+            logger.error("InfluxDB python client not installed; readings are not written to InfluxDB")
+        else:
+            logger.debug("Starting InfluxDB Writer Thread")
+            cInfluxWriter = influxwriter.InfluxWriter('localhost', 8086, 'brewing')
+            cInfluxWriter.start()
+
+    # Start local history store
+    if _settings.storage in (STORAGE_LOCAL, STORAGE_BOTH):
+        logger.debug("Starting History Thread")
+        cHistory = history.History(_settings.historyFile, dict(_settings.retention))
+        cHistory.start()
+
+    _topics = [sensorbus.TOPIC_CHAMBER, sensorbus.TOPIC_TILT]
+    cBus.subscribe(_topics, _updateInterface, INTERFACE_MIN_INTERVAL, INTERFACE_MAX_INTERVAL)
+    cBus.subscribe(_topics, _updateBrewfather, BREWFATHER_MIN_INTERVAL)
+    cBus.subscribe(_topics, _storeData, STORE_MIN_INTERVAL, STORE_MAX_INTERVAL)
+
+    _chamberTopics = [c.topic for c in cFermenters.getChambers()]
+    cBus.subscribe(_chamberTopics, _checkpointRelays)
+
+    cWebState.attach(cChamber, cTilt, cBrewfather, cFermenters.getChambers())
+    cBus.subscribe(_topics + [t for t in _chamberTopics if t != sensorbus.TOPIC_CHAMBER], cWebState.notify, WEB_MIN_INTERVAL)
+    cBrewfather.subscribe(cWebState.notify)
+    chamber.subscribeConfig(cWebState.notify)
+
+    # Web server settings are only read at start
+    cWebServer = webserver.WebServer(app, _settings.web)
+    cWebServer.start()
+
+    # Main loop only follows configuration changes; data is delivered through the sensor bus
     while True:
 
         read_settings()
@@ -177,86 +410,66 @@ def main():
         else:
             cChamber.setTiltColor(None)
 
-        _tBeerT = None
-        _tBeerSG = None
-        _cBeerT = cChamber.getBeerTemp()
-        _cWireBeerT = cChamber.getWiredBeerTemp()
-        _cChamberT = cChamber.getChamberTemp()
-        _cTargetT = cChamber.getTargetTemp()
-        _cTiltControlled = cChamber.isTiltControlled()
-        _cHeating = cChamber.isHeating()
-        _cCooling = cChamber.isCooling()
-        _cTimeData = cChamber.timeOfData()
-
-        if sTiltColor is not None:
-            _tiltdata = {}
-            _tiltdata = cTilt.getData(sTiltColor)
-            if _tiltdata is not None:
-                _tBeerT = _tiltdata.get(tilt.TEMP)
-                _tBeerSG = _tiltdata.get(tilt.SG)
-
-        cBrewfather.setData(_cBeerT, _cChamberT, _tBeerSG)        
-
-        cInterface.setData( \
-            _cTargetT, \
-            _cWireBeerT, \
-            _cChamberT, \
-            _tBeerSG, \
-            _tBeerT, \
-            _cTiltControlled)
-
-
-        # Write data to InfluxDB
-        _fields = {}
-
-        if _cTargetT is not None:
-            _fields["targetTemp"] = str(round(float(_cTargetT),1))
-        if _cChamberT is not None:
-            _fields["chamberTemp"] = str(round(float(_cChamberT),1))
-        if _cWireBeerT is not None:
-            _fields["beerTemp"] = str(round(float(_cWireBeerT),1))
-        if _tBeerT is not None:
-            _fields["tiltTemp"] = str(round(float(_tBeerT),1))
-        if _tBeerSG is not None:
-            _fields["gravity"] = "{:5.3f}".format(round(float(_tBeerSG),3))
-        _fields["heating"] = _cHeating
-        _fields["cooling"] = _cCooling
-        _fields["tiltControlled"] = _cTiltControlled
-
-        _postdata = [
-            {
-                "measurement": "fermonitor",
-                "time": datetime.datetime.utcnow(),
-                "fields": _fields
-            }
-        ]
-      
-        client.write_points(_postdata)
-
-        time.sleep(0.5)
+        cWebState.setTiltColor(sTiltColor)
+
+        time.sleep(SETTINGS_INTERVAL)
 
 app = Flask(__name__)
+
+# Measures time spent handling each request; for streams only the time until the response starts is measured
+@app.before_request
+def _startTimer():
+    g.requestStart = time.perf_counter()
+
+@app.after_request
+def _stopTimer(_response):
+    if "requestStart" in g:
+        _duration = time.perf_counter() - g.requestStart
+        cRequestStats.record(_duration)
+        _response.headers["Server-Timing"] = "app;dur={:.1f}".format(_duration*1000)
+    return _response
+
+# Dashboard; rendered page and its gzip compressed form are cached until chamber, Tilt, BrewFather or chamber
+# configuration (schedule) changes
 @app.route("/", methods=["GET","POST"])
 def index_html():
+    _key = cWebState.getKey()
+    _etag = cWebState.getETag(_key)
+    _html, _gzip = cRenderCache.get("index", _key, _renderIndex)
+
+    if request.if_none_match.contains(_etag):
+        _response = Response(status=304)
+    elif "gzip" in request.headers.get("Accept-Encoding", ""):
+        _response = Response(_gzip, mimetype="text/html")
+        _response.headers["Content-Encoding"] = "gzip"
+    else:
+        _response = Response(_html, mimetype="text/html")
+    _response.set_etag(_etag)
+    _response.headers["Vary"] = "Accept-Encoding"
+    _response.headers["Cache-Control"] = "no-cache"
+    return _response
+
+def _renderIndex():
     _chamberdata = {}
 
     if cChamber is not None:
+        _state = cChamber.snapshot()
         _chamberdata['dates'] = ', '.join([item.strftime("%d.%m.%Y %H:%M:%S") for item in cChamber.getDates()])
         _chamberdata['temps'] = ', '.join([str(round(float(item),1)) for item in cChamber.getTemps()])
-        if cChamber.getTargetTemp() is not None:
-            _chamberdata['target'] = str(round(float(cChamber.getTargetTemp()),1))
-        if cChamber.getBeerTemp() is not None:
-            _chamberdata['tempBeer'] = str(round(float(cChamber.getBeerTemp()),1))
-        if cChamber.getWiredBeerTemp() is not None:
-            _chamberdata['tempBeerWire'] = str(round(float(cChamber.getWiredBeerTemp()),1))
-        if cChamber.getChamberTemp() is not None:
-            _chamberdata['tempChamber'] = str(round(float(cChamber.getChamberTemp()),1))
-        if cChamber.timeOfData() is not None:
-            _chamberdata['timeBeer'] = cChamber.timeOfData().strftime("%d.%m.%Y %H:%M:%S")
-        if cChamber.isTiltControlled() and sTiltColor is not None:
+        if _state.targetTemp is not None:
+            _chamberdata['target'] = str(round(float(_state.targetTemp),1))
+        if _state.beerTemp is not None:
+            _chamberdata['tempBeer'] = str(round(float(_state.beerTemp),1))
+        if _state.wireBeerTemp is not None:
+            _chamberdata['tempBeerWire'] = str(round(float(_state.wireBeerTemp),1))
+        if _state.chamberTemp is not None:
+            _chamberdata['tempChamber'] = str(round(float(_state.chamberTemp),1))
+        if _state.time is not None:
+            _chamberdata['timeBeer'] = _state.time.strftime("%d.%m.%Y %H:%M:%S")
+        if _state.tiltControlled and sTiltColor is not None:
             _chamberdata['tiltColor'] = sTiltColor
-        _chamberdata['heating'] = str(cChamber.isHeating())
-        _chamberdata['cooling'] = str(cChamber.isCooling())
+        _chamberdata['heating'] = str(_state.heating)
+        _chamberdata['cooling'] = str(_state.cooling)
 
     _tiltdata = []
     if sTiltColor is not None:
@@ -271,6 +484,98 @@ def index_html():
     return render_template('fermonitor.html', chamberdata=_chamberdata, tiltdata=_tiltdata, brewfatherdata = _brewfatherdata)
 
 
+# Returns readings stored in local history as JSON. Parameters (seconds since epoch): start, end (default now),
+# resolution (raw, minute, quarter; default picked from range) and field (can be repeated)
+@app.route("/api/history", methods=["GET"])
+def history_json():
+    if cHistory is None:
+        return jsonify({"error": "local history not enabled"}), 404
+
+    try:
+        _end = float(request.args.get("end", time.time()))
+        _start = float(request.args.get("start", _end - 86400))
+        _fields = request.args.getlist("field") or None
+        return jsonify(cHistory.query(_start, _end, _fields, request.args.get("resolution")))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+# Returns current state of chamber, Tilt and BrewFather as JSON. Serialized state is cached until something changes;
+# clients sending the ETag in If-None-Match get 304 Not Modified while nothing changed.
+@app.route("/api/state", methods=["GET"])
+def state_json():
+    _key, _state, _json = cWebState.getState()
+    _etag = cWebState.getETag(_key)
+
+    if request.if_none_match.contains(_etag):
+        _response = Response(status=304)
+    else:
+        _response = Response(_json, mimetype="application/json")
+    _response.set_etag(_etag)
+    _response.headers["Cache-Control"] = "no-cache"
+    return _response
+
+# Server-Sent Events stream. First event ("state") is the full state, following events ("delta") only contain the
+# sections and values that changed. Each open stream holds a web server thread so their number is limited.
+@app.route("/api/stream", methods=["GET"])
+def state_stream():
+    if cWebServer is not None and not cWebServer.acquireStream():
+        _response = Response("Too many open streams\n", status=503, mimetype="text/plain")
+        _response.headers["Retry-After"] = str(STREAM_KEEPALIVE)
+        return _response
+
+    def _events():
+        _key, _state, _json = cWebState.getState()
+        yield "event: state\nid: " + cWebState.getETag(_key) + "\ndata: " + _json.decode('utf8') + "\n\n"
+
+        while True:
+            if cWebState.wait(_key, STREAM_KEEPALIVE) == _key:
+                yield ": keep-alive\n\n"
+                continue
+
+            _newKey, _newState, _newJSON = cWebState.getState()
+            _changes = webstate.delta(_state, _newState)
+            _key, _state = _newKey, _newState
+
+            if len(_changes) > 0:
+                yield "event: delta\nid: " + cWebState.getETag(_key) + "\ndata: " + json.dumps(_changes, separators=(',', ':')) + "\n\n"
+
+    _response = Response(stream_with_context(_events()), mimetype="text/event-stream")
+    _response.headers["Cache-Control"] = "no-cache"
+    _response.headers["X-Accel-Buffering"] = "no"
+    if cWebServer is not None:
+        _response.call_on_close(cWebServer.releaseStream)
+    return _response
+
+# Returns counters of internal caches and queues as JSON
+@app.route("/api/stats", methods=["GET"])
+def stats_json():
+    _stats = {}
+    _stats["web"] = {
+        "requests": cRequestStats.getRequests(),
+        "requestsPerSecond": cRequestStats.getRequestsPerSecond(),
+        "avgDuration": cRequestStats.getAvgDuration(),
+        "maxDuration": cRequestStats.getMaxDuration()}
+    _stats["renderCache"] = {"hits": cRenderCache.getHits(), "misses": cRenderCache.getMisses()}
+    _stats["pointFilter"] = {"emitted": cPointFilter.getEmitted(), "suppressed": cPointFilter.getSuppressed()}
+    if cInfluxWriter is not None:
+        _stats["influxdb"] = {
+            "queueDepth": cInfluxWriter.getQueueDepth(),
+            "flushLatency": cInfluxWriter.getFlushLatency(),
+            "avgFlushLatency": cInfluxWriter.getAvgFlushLatency(),
+            "spilledPoints": cInfluxWriter.getSpilledPoints(),
+            "fieldConflicts": cInfluxWriter.getFieldConflicts(),
+            "droppedPoints": cInfluxWriter.getDroppedPoints()}
+    if cHistory is not None:
+        _stats["history"] = {"droppedPoints": cHistory.getDroppedPoints()}
+    if cStateFile is not None:
+        _stats["stateFile"] = cStateFile.getStats()
+    if cFermenters is not None:
+        _stats["probes"] = cFermenters.getProbeStats()
+        _stats["relays"] = cFermenters.getRelayStats()
+    return jsonify(_stats)
+
+
 if __name__ == "__main__": #dont run this as a module
 
     try:
@@ -281,21 +586,46 @@ if __name__ == "__main__": #dont run this as a module
         handler = TimedRotatingFileHandler(LOGFILE, when="h", interval=24, backupCount=21)
         formatter = logging.Formatter('%(asctime)s %(levelname)s {%(module)s} [%(funcName)s] %(message)s', datefmt='%Y-%m-%d,%H:%M:%S')
         handler.setFormatter(formatter)
-        logger.addHandler(handler)
 
-        threading.Thread(target=app.run, args=('0.0.0.0','5000',False)).start()
+        # log file is written by a background thread so control threads never wait for disk I/O
+        logQueue = queue.Queue(-1)
+        logListener = QueueListener(logQueue, handler)
+        logListener.start()
+        logger.addHandler(QueueHandler(logQueue))
+
         main()
 
     except KeyboardInterrupt:
         if cTilt is not None:
             cTilt.stop()
             cTilt = None
-        if cChamber is not None:
-            cChamber.stop()
+        if cFermenters is not None:
+            cFermenters.stop()
+            cFermenters.join()
+            cFermenters = None
             cChamber = None
         if cBrewfather is not None:
             cBrewfather.stop()
             cBrewfather = None
-
+        if cInfluxWriter is not None:
+            cInfluxWriter.stop()
+            cInfluxWriter.join()
+            cInfluxWriter = None
+        if cHistory is not None:
+            cHistory.stop()
+            cHistory.join()
+            cHistory = None
+        if cWebServer is not None:
+            cWebServer.stop()
+            cWebServer = None
+        if cBus is not None:
+            cBus.stop()
+            cBus = None
+        if cStateFile is not None:
+            cStateFile.stop()
+            cStateFile.join()
+            cStateFile = None
+
+        logListener.stop()
         print("...Fermonitor Stopped")
  
@@ -0,0 +1,289 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import time
+import queue
+import shutil
+import tempfile
+import threading
+import logging
+
+import onewire
+
+logger = logging.getLogger('FERMONITOR.HARDWARE')
+logger.setLevel(logging.INFO)
+
+# Backends
+PI = "PI"                   # Raspberry Pi: RPi.GPIO, I2C LCD (smbus), 1-wire sysfs and bluetooth HCI socket
+SIMULATED = "SIMULATED"     # in-memory GPIO, virtual LCD, fake 1-wire sysfs tree and injected BLE advertisements
+
+ENVIRONMENT = "FERMONITOR_HARDWARE"    # environment variable selecting the backend; default PI
+W1_SLAVE_SIZE = 128                    # bytes of simulated w1_slave files; padded so updates never shrink them
+
+_backend = None
+_lock = threading.Lock()
+
+# Access to the hardware Chamber, Interface and Tilt depend on goes through this module so they can run on any Linux
+# box with the simulated backend, e.g. for load tests and benchmarks. The backend has to be selected before the first
+# access; otherwise it is taken from the FERMONITOR_HARDWARE environment variable. The Pi modules (RPi.GPIO, smbus,
+# bluetooth) are only imported when the PI backend is used.
+def select(_name):
+    global _backend
+
+    with _lock:
+        if _backend is not None:
+            if _backend.name == _name:
+                return _backend
+            raise RuntimeError("Hardware backend already selected: "+_backend.name)
+
+        if _name == PI:
+            _backend = _PiBackend()
+        elif _name == SIMULATED:
+            _backend = SimulatedBackend()
+        else:
+            raise ValueError("Unknown hardware backend: "+str(_name))
+
+        logger.info("Using hardware backend: "+_name)
+        return _backend
+
+# returns selected backend; selects backend from environment if none has been selected yet
+def backend():
+    if _backend is None:
+        return select(os.environ.get(ENVIRONMENT, PI))
+    return _backend
+
+# GPIO module of the selected backend; used like RPi.GPIO
+class _GPIOProxy:
+
+    def __getattr__(self, _name):
+        return getattr(backend().gpio, _name)
+
+GPIO = _GPIOProxy()
+
+# returns 16x2 character LCD of the selected backend
+def createLCD():
+    return backend().createLCD()
+
+# returns BLE scanner of bluetooth device of the selected backend
+def openBLE(_deviceId):
+    return backend().openBLE(_deviceId)
+
+class _PiBackend:
+
+    def __init__(self):
+        import RPi.GPIO
+        self.name = PI
+        self.gpio = RPi.GPIO
+
+    def createLCD(self):
+        import I2C_LCD_driver
+        return I2C_LCD_driver.lcd()
+
+    def openBLE(self, _deviceId):
+        return _HCIScanner(_deviceId)
+
+# Scans BLE advertisements with a raw HCI socket; read() returns advertisements as parsed by blescan:
+# "address,uuid,major,minor,txpower,rssi" with values as hex strings
+class _HCIScanner:
+
+    def __init__(self, _deviceId):
+        import blescan
+        import bluetooth._bluetooth as bluez
+        self.blescan = blescan
+        self.sock = bluez.hci_open_dev(_deviceId)
+
+    def start(self):
+        self.blescan.hci_le_set_scan_parameters(self.sock)
+        self.blescan.hci_enable_le_scan(self.sock)
+
+    def read(self, _count):
+        return self.blescan.parse_events(self.sock, _count)
+
+    def stop(self):
+        self.blescan.hci_disable_le_scan(self.sock)
+
+################################################################
+# Simulated backend
+
+class SimulatedBackend:
+
+    def __init__(self):
+        self.name = SIMULATED
+        self.gpio = SimulatedGPIO()
+        self.w1 = SimulatedW1()
+        self.lcds = []
+        self.ble = SimulatedBLE()
+
+    def createLCD(self):
+        lcd = SimulatedLCD()
+        self.lcds.append(lcd)
+        return lcd
+
+    def openBLE(self, _deviceId):
+        return self.ble
+
+# In-memory replacement of RPi.GPIO. Every output is recorded with monotonic time so tests can check relay
+# transitions; inputs (e.g. motion sensor) are set with setInput().
+class SimulatedGPIO:
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.modes = {}
+        self.values = {}
+        self.writes = []        # (monotonic time, pin, value)
+
+    def setmode(self, _mode):
+        pass
+
+    def setwarnings(self, _flag):
+        pass
+
+    def setup(self, _pin, _mode):
+        self.modes[_pin] = _mode
+        self.values.setdefault(_pin, self.LOW)
+
+    def output(self, _pin, _value):
+        with self.lock:
+            self.values[_pin] = _value
+            self.writes.append((time.monotonic(), _pin, _value))
+
+    def input(self, _pin):
+        return self.values.get(_pin, self.LOW)
+
+    def cleanup(self):
+        self.modes.clear()
+
+    def setInput(self, _pin, _value):
+        self.values[_pin] = _value
+
+    # returns recorded writes, optionally only those of pin
+    def getWrites(self, _pin=None):
+        with self.lock:
+            return [w for w in self.writes if _pin is None or w[1] == _pin]
+
+    def clearWrites(self):
+        with self.lock:
+            self.writes = []
+
+# Virtual 16x2 character LCD with the methods of I2C_LCD_driver.lcd used by Interface
+class SimulatedLCD:
+
+    ROWS = 2
+    COLUMNS = 16
+
+    def __init__(self):
+        self.rows = [""] * self.ROWS
+        self.light = 0
+        self.updates = 0
+
+    def backlight(self, _state):
+        self.light = _state
+
+    def lcd_display_string(self, _string, _line=1, _pos=0):
+        row = self.rows[_line-1].ljust(_pos)
+        self.rows[_line-1] = (row[:_pos] + _string + row[_pos+len(_string):])[:self.COLUMNS]
+        self.updates += 1
+
+    def lcd_clear(self):
+        self.rows = [""] * self.ROWS
+        self.updates += 1
+
+    # returns text shown on the display
+    def getText(self):
+        return list(self.rows)
+
+# Fake /sys/bus/w1/devices tree in a temporary directory. onewire reads from it once the simulated backend is
+# selected; probes are added, changed and removed while running.
+class SimulatedW1:
+
+    def __init__(self):
+        self.path = tempfile.mkdtemp(prefix="w1-") + "/"
+        self.master = self.path + "w1_bus_master1"
+        os.mkdir(self.master)
+        onewire.DEVICES = self.path
+
+    # creates or updates probe with temperature in degrees celcius; crc False simulates a transmission error
+    def setTemp(self, _id, _temp, _crc=True):
+        os.makedirs(self.path + _id, exist_ok=True)
+        link = self.master + "/" + _id
+        if not os.path.lexists(link):
+            os.symlink(self.path + _id, link)
+            # probes power up at 12 bit; resolution written by onewire is kept in the file
+            with open(self.path + _id + "/resolution", "w") as f:
+                f.write("12\n")
+
+        data = "72 01 4b 46 7f ff 0e 10 57 : crc=57 " + ("YES" if _crc else "NO") + "\n"
+        data += "72 01 4b 46 7f ff 0e 10 57 t=" + str(int(round(_temp*1000))) + "\n"
+
+        # probes keep w1_slave open, so the file is overwritten in place with a single write of fixed length
+        fd = os.open(self.path + _id + "/w1_slave", os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, data.ljust(W1_SLAVE_SIZE).encode('ascii'), 0)
+        finally:
+            os.close(fd)
+
+    def remove(self, _id):
+        if os.path.lexists(self.master + "/" + _id):
+            os.remove(self.master + "/" + _id)
+        shutil.rmtree(self.path + _id, ignore_errors=True)
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+# BLE scanner returning injected advertisements in the format of the HCI scanner
+class SimulatedBLE:
+
+    WAIT_SEC = 0.1      # read() waits this long for an advertisement so scanning loops do not spin
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.scanning = False
+
+    def start(self):
+        self.scanning = True
+
+    def read(self, _count):
+        result = []
+        try:
+            result.append(self.queue.get(timeout=self.WAIT_SEC))
+            while len(result) < _count:
+                result.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return result
+
+    def stop(self):
+        self.scanning = False
+
+    def inject(self, _advertisement):
+        self.queue.put(_advertisement)
+
+    # injects iBeacon advertisement with uuid (32 hex digits) and major/minor values
+    def injectIBeacon(self, _uuid, _major, _minor, _address="aa:bb:cc:dd:ee:ff"):
+        self.inject(_address + "," + _uuid + "," + "{:04x}".format(_major) + "," + "{:04x}".format(_minor) + ",c5,c0")
@@ -0,0 +1,205 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+import queue
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger('FERMONITOR.HISTORY')
+logger.setLevel(logging.INFO)
+
+DATABASE = "fermonitor.db"
+
+# Resolutions data is stored in; name of table -> seconds per row (0 = every point written)
+RAW = "raw"
+MINUTE = "minute"
+QUARTER = "quarter"
+RESOLUTIONS = [(RAW, 0), (MINUTE, 60), (QUARTER, 900)]
+
+DEFAULT_RETENTION = {RAW: 7, MINUTE: 90, QUARTER: 730}  # days rows are kept per resolution
+
+COMMIT_SEC = 10         # points are committed to disk in one transaction at most this often
+MAINTENANCE_SEC = 300   # interval for downsampling and removing expired rows
+MAX_QUEUE = 10000
+MAX_ROWS = 2000         # rows per field a query aims for when picking resolution automatically
+
+# Embedded time-series store for the readings written to InfluxDB, so history is kept on a single board without
+# running a database server. Points are stored in SQLite (WAL mode) one row per field and automatically downsampled
+# from raw points into 1 minute and 15 minute averages. Each resolution has its own retention so disk usage stays
+# bounded. Booleans are stored as 0/1 so their average is the fraction of time they were on.
+class History (threading.Thread):
+
+    def __init__(self, _filename=DATABASE, _retention=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.stopThread = True
+        self.filename = _filename
+        self.retention = dict(DEFAULT_RETENTION)
+        if _retention is not None:
+            self.retention.update(_retention)
+
+        self.queue = queue.Queue(maxsize=MAX_QUEUE)
+        self.droppedPoints = 0
+
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for name, seconds in RESOLUTIONS:
+                conn.execute("CREATE TABLE IF NOT EXISTS "+name+" (time INTEGER NOT NULL, field TEXT NOT NULL, value REAL, minimum REAL, maximum REAL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS "+name+"_time ON "+name+" (time, field)")
+            conn.execute("CREATE TABLE IF NOT EXISTS rollup (name TEXT PRIMARY KEY, until INTEGER NOT NULL)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    # Starts the background thread
+    def run(self):
+        logger.info("Starting History")
+        self.stopThread = False
+
+        conn = self._connect()
+        nextCommit = time.monotonic() + COMMIT_SEC
+        nextMaintenance = time.monotonic()
+        rows = []
+
+        while self.stopThread != True:
+            try:
+                timestamp, fields = self.queue.get(timeout=1.0)
+                for name, value in fields.items():
+                    if value is not None:
+                        value = float(value)
+                        rows.append((timestamp, name, value, value, value))
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            if now >= nextCommit:
+                self._commit(conn, rows)
+                rows = []
+                nextCommit = now + COMMIT_SEC
+
+            if now >= nextMaintenance:
+                self._maintain(conn)
+                nextMaintenance = now + MAINTENANCE_SEC
+
+        self._commit(conn, rows)
+        conn.close()
+        logger.info("History Stopped")
+
+    def stop(self):
+        self.stopThread = True
+
+    # queues fields for storing; timestamp in seconds since epoch, defaults to current time. Never blocks the caller.
+    def write(self, _fields, _timestamp=None):
+        if _timestamp is None:
+            _timestamp = time.time()
+        try:
+            self.queue.put_nowait((int(_timestamp), dict(_fields)))
+        except queue.Full:
+            self.droppedPoints += 1
+            logger.warning("History write queue full; dropped point")
+
+    # Returns stored values between start and end (seconds since epoch) as dictionary of field -> list of
+    # (time, average, minimum, maximum). If resolution is not given the finest resolution still holding data for the
+    # start of the range is used, limited to roughly MAX_ROWS rows per field.
+    def query(self, _start, _end, _fields=None, _resolution=None):
+        if _resolution is None:
+            _resolution = self._pickResolution(_start, _end)
+        if _resolution not in [name for name, seconds in RESOLUTIONS]:
+            raise ValueError("Unknown resolution: "+str(_resolution))
+
+        sql = "SELECT time, field, value, minimum, maximum FROM "+_resolution+" WHERE time >= ? AND time < ?"
+        params = [int(_start), int(_end)]
+        if _fields is not None:
+            sql += " AND field IN ("+",".join("?"*len(_fields))+")"
+            params.extend(_fields)
+        sql += " ORDER BY time"
+
+        result = {}
+        conn = self._connect()
+        try:
+            for t, field, value, minimum, maximum in conn.execute(sql, params):
+                result.setdefault(field, []).append((t, value, minimum, maximum))
+        finally:
+            conn.close()
+        return result
+
+    def getDroppedPoints(self):
+        return self.droppedPoints
+
+    def _pickResolution(self, _start, _end):
+        now = time.time()
+        span = _end - _start
+        for name, seconds in RESOLUTIONS:
+            if _start < now - self.retention[name]*86400:
+                continue
+            if seconds == 0 and span <= 86400:
+                return name
+            if seconds > 0 and span / seconds <= MAX_ROWS:
+                return name
+        return RESOLUTIONS[-1][0]
+
+    def _connect(self):
+        conn = sqlite3.connect(self.filename, timeout=10)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _commit(self, _conn, _rows):
+        if len(_rows) == 0:
+            return
+        try:
+            with _conn:
+                _conn.executemany("INSERT INTO "+RAW+" VALUES (?,?,?,?,?)", _rows)
+        except sqlite3.Error:
+            self.droppedPoints += len(_rows)
+            logger.exception("Unable to store points in: "+self.filename)
+
+    # aggregates completed intervals into the next resolution and removes rows past their retention
+    def _maintain(self, _conn):
+        now = int(time.time())
+        # points still waiting in memory must not fall into an interval that is already aggregated
+        limit = now - 2*COMMIT_SEC
+        try:
+            with _conn:
+                source = RAW
+                for name, seconds in RESOLUTIONS[1:]:
+                    row = _conn.execute("SELECT until FROM rollup WHERE name = ?", (name,)).fetchone()
+                    if row is not None:
+                        since = row[0]
+                    else:
+                        row = _conn.execute("SELECT MIN(time) FROM "+source).fetchone()
+                        since = (row[0] // seconds) * seconds if row[0] is not None else now
+                    until = (limit // seconds) * seconds
+
+                    if until > since:
+                        _conn.execute("INSERT INTO "+name+" SELECT (time / ?) * ?, field, AVG(value), MIN(minimum), MAX(maximum) FROM "+source+
+                            " WHERE time >= ? AND time < ? GROUP BY time / ?, field", (seconds, seconds, since, until, seconds))
+                        _conn.execute("INSERT OR REPLACE INTO rollup VALUES (?, ?)", (name, until))
+                    source = name
+                    limit = until
+
+                for name, seconds in RESOLUTIONS:
+                    _conn.execute("DELETE FROM "+name+" WHERE time < ?", (now - self.retention[name]*86400,))
+        except sqlite3.Error:
+            logger.exception("Problem downsampling history in: "+self.filename)
@@ -0,0 +1,302 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import time
+import queue
+import threading
+import logging
+
+from influxdb import InfluxDBClient
+from influxdb.exceptions import InfluxDBClientError
+
+logger = logging.getLogger('FERMONITOR.INFLUXWRITER')
+logger.setLevel(logging.INFO)
+
+DEFAULT_HOST = "localhost"
+DEFAULT_PORT = 8086
+DEFAULT_DATABASE = "brewing"
+SPILLFILE = "influxdb.spill"
+
+BATCH_SIZE = 60         # number of queued points that triggers a flush
+FLUSH_SEC = 10          # maximum age in seconds of the oldest queued point before it is flushed
+MAX_QUEUE = 10000       # points held in memory before new points are dropped
+REPLAY_BATCH = 5000     # number of spilled points sent per request when replaying backlog
+TIMEOUT_SEC = 5         # timeout for a single request to InfluxDB
+MAX_SPILL = 100000      # points kept in spill file; oldest points are dropped beyond this
+
+# Background thread writing points to InfluxDB. Points are line protocol bytes (see lineprotocol.py) which are queued
+# by write() without blocking the caller and sent in batches. When InfluxDB cannot be reached the batch is appended to a local spill file which is replayed in bulk
+# once InfluxDB is available again. Points InfluxDB rejects (4xx, e.g. field type conflict) would be rejected again on
+# every retry, so they are dropped instead of spilled.
+class InfluxWriter (threading.Thread):
+
+    def __init__(self, _host=DEFAULT_HOST, _port=DEFAULT_PORT, _database=DEFAULT_DATABASE, _spillfile=SPILLFILE):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.stopThread = True
+        self.database = _database
+        self.spillfile = _spillfile
+        self.client = InfluxDBClient(host=_host, port=_port, timeout=TIMEOUT_SEC)
+        self.bDatabaseReady = False
+
+        self.queue = queue.Queue(maxsize=MAX_QUEUE)
+        self.droppedPoints = 0
+        self.spilledPoints = 0
+        self.flushCount = 0
+        self.lastFlushLatency = None
+        self.avgFlushLatency = None
+        self.fieldCheck = None          # (measurement, field name -> type) still to be checked
+        self.fieldConflicts = []        # fields stored with another type than written
+
+        if os.path.isfile(self.spillfile):
+            with open(self.spillfile, 'rb') as f:
+                self.spilledPoints = sum(1 for line in f)
+            logger.info("Found "+str(self.spilledPoints)+" spilled InfluxDB points in: "+self.spillfile+"; will replay when InfluxDB is available")
+
+    # Starts the background thread
+    def run(self):
+        logger.info("Starting InfluxDB Writer")
+        self.stopThread = False
+
+        batch = []
+        batchStart = None
+
+        while self.stopThread != True:
+            timeout = FLUSH_SEC
+            if batchStart is not None:
+                timeout = max(0.0, batchStart + FLUSH_SEC - time.monotonic())
+
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+                if batchStart is None:
+                    batchStart = time.monotonic()
+            except queue.Empty:
+                pass
+
+            if len(batch) >= BATCH_SIZE or (batchStart is not None and time.monotonic() - batchStart >= FLUSH_SEC):
+                self._flush(batch)
+                batch = []
+                batchStart = None
+
+        # write whatever is left before stopping
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if len(batch) > 0:
+            self._flush(batch)
+
+        logger.info("InfluxDB Writer Stopped")
+
+    # stops the background thread; queued points are flushed before thread ends
+    def stop(self):
+        self.stopThread = True
+
+    # queues a line protocol encoded point for writing; never blocks the caller
+    def write(self, _point):
+        if _point is None:
+            return
+        try:
+            self.queue.put_nowait(_point)
+        except queue.Full:
+            self.droppedPoints += 1
+            logger.warning("InfluxDB write queue full; dropped point")
+
+    # number of points waiting to be sent to InfluxDB
+    def getQueueDepth(self):
+        return self.queue.qsize()
+
+    # duration in seconds of the last successful flush to InfluxDB
+    def getFlushLatency(self):
+        return self.lastFlushLatency
+
+    # average duration in seconds of successful flushes to InfluxDB
+    def getAvgFlushLatency(self):
+        return self.avgFlushLatency
+
+    # number of points currently stored in spill file waiting to be replayed
+    def getSpilledPoints(self):
+        return self.spilledPoints
+
+    def getDroppedPoints(self):
+        return self.droppedPoints
+
+    # Requests a check if measurement already stores any of the fields with another type (e.g. strings written by
+    # older versions); InfluxDB would reject every point then. Types are InfluxDB field types: float, boolean, ...
+    # The check is run by the writer thread once InfluxDB is reachable.
+    def checkFieldTypes(self, _measurement, _types):
+        self.fieldCheck = (_measurement, dict(_types))
+
+    # returns fields found with conflicting type by the latest check as list of "field: stored type"
+    def getFieldConflicts(self):
+        return list(self.fieldConflicts)
+
+    # sends batch to InfluxDB, any backlog in the spill file is replayed first to keep points in order
+    def _flush(self, _batch):
+        try:
+            self._connect()
+
+            # a query InfluxDB refuses would fail the same way again, so the check is not repeated
+            check = self.fieldCheck
+            if check is not None:
+                try:
+                    self._checkFieldTypes(check[0], check[1])
+                except Exception as e:
+                    if _rejected(e):
+                        self.fieldCheck = None
+                        logger.error("Unable to check field types of InfluxDB measurement "+check[0]+": "+str(e))
+                    raise
+                self.fieldCheck = None
+
+            self._replay()
+
+            # only a write refused by InfluxDB drops points; failing to connect or to query spills them
+            start = time.monotonic()
+            try:
+                self._send(_batch)
+            except Exception as e:
+                if not _rejected(e):
+                    raise
+                self.droppedPoints += len(_batch)
+                logger.error("InfluxDB rejected "+str(len(_batch))+" points; points dropped: "+str(e))
+                return
+            latency = time.monotonic() - start
+
+            self.flushCount += 1
+            self.lastFlushLatency = latency
+            if self.avgFlushLatency is None:
+                self.avgFlushLatency = latency
+            else:
+                self.avgFlushLatency = 0.9*self.avgFlushLatency + 0.1*latency
+
+            logger.debug("Flushed "+str(len(_batch))+" points to InfluxDB in "+str(round(latency*1000,1))+"ms; queue depth: "+str(self.getQueueDepth()))
+
+        except Exception:
+            if self.bDatabaseReady:
+                logger.warning("InfluxDB unavailable; spilling points to: "+self.spillfile)
+            self.bDatabaseReady = False
+            self._spill(_batch)
+
+    def _connect(self):
+        if not self.bDatabaseReady:
+            self.client.create_database(self.database)
+            self.client.switch_database(self.database)
+            self.bDatabaseReady = True
+            logger.info("Connected to InfluxDB database: "+self.database)
+
+    def _checkFieldTypes(self, _measurement, _types):
+        result = self.client.query('SHOW FIELD KEYS FROM "' + _measurement.replace('"', '\\"') + '"', database=self.database)
+
+        conflicts = []
+        for point in result.get_points():
+            expected = _types.get(point.get("fieldKey"))
+            if expected is not None and point.get("fieldType") != expected:
+                conflicts.append(point["fieldKey"] + ": " + str(point.get("fieldType")))
+
+        self.fieldConflicts = conflicts
+        if len(conflicts) > 0:
+            logger.error("InfluxDB measurement "+_measurement+" stores fields with another type than written ("+", ".join(conflicts)+
+                "); InfluxDB rejects these points. Set a new Measurement in [InfluxDB] of fermonitor.ini")
+
+    # posts points to the write endpoint as a single line protocol request
+    def _send(self, _points):
+        self.client.request(url="write", method="POST", params={'db': self.database}, data=b"\n".join(_points) + b"\n",
+                            expected_response_code=204, headers={'Content-Type': 'application/octet-stream'})
+
+    # appends points to the spill file; the file is plain line protocol with one point per line
+    def _spill(self, _batch):
+        try:
+            with open(self.spillfile, 'ab') as f:
+                f.write(b"\n".join(_batch) + b"\n")
+            self.spilledPoints += len(_batch)
+        except Exception:
+            self.droppedPoints += len(_batch)
+            logger.exception("Unable to spill points to: "+self.spillfile)
+            return
+
+        # file is trimmed once it is 10% over the limit so a long outage does not rewrite it on every flush
+        if self.spilledPoints > MAX_SPILL + MAX_SPILL // 10:
+            self._trim()
+
+    # drops oldest points of the spill file so at most MAX_SPILL points are kept
+    def _trim(self):
+        try:
+            with open(self.spillfile, 'rb') as f:
+                lines = [line for line in f if len(line.strip()) > 0]
+            dropped = max(0, len(lines) - MAX_SPILL)
+            with open(self.spillfile + ".tmp", 'wb') as f:
+                f.writelines(lines[dropped:])
+            os.replace(self.spillfile + ".tmp", self.spillfile)
+            self.spilledPoints = len(lines) - dropped
+            self.droppedPoints += dropped
+            logger.warning("Spill file full; dropped "+str(dropped)+" oldest points from: "+self.spillfile)
+        except OSError:
+            logger.exception("Unable to trim spill file: "+self.spillfile)
+
+    # sends the content of the spill file to InfluxDB in large batches and removes the file when completed. If the
+    # replay fails part way the file is kept; rewriting points already sent is harmless as InfluxDB overwrites points
+    # with identical measurement, tags and time. Batches InfluxDB rejects are dropped so they never block the backlog.
+    def _replay(self):
+        if not os.path.isfile(self.spillfile):
+            return
+
+        logger.info("Replaying spilled points from: "+self.spillfile)
+        replayed = 0
+        with open(self.spillfile, 'rb') as f:
+            points = []
+            for line in f:
+                line = line.rstrip(b"\n")
+                if len(line) == 0:
+                    continue
+                points.append(line)
+
+                if len(points) >= REPLAY_BATCH:
+                    replayed += self._sendSpilled(points)
+                    points = []
+
+            if len(points) > 0:
+                replayed += self._sendSpilled(points)
+
+        os.remove(self.spillfile)
+        self.spilledPoints = 0
+        logger.info("Replayed "+str(replayed)+" spilled points to InfluxDB")
+
+    # sends points of spill file; returns number of points written. Rejected points are dropped, any other error is
+    # raised so the spill file is kept.
+    def _sendSpilled(self, _points):
+        try:
+            self._send(_points)
+            return len(_points)
+        except Exception as e:
+            if not _rejected(e):
+                raise
+            self.droppedPoints += len(_points)
+            logger.error("InfluxDB rejected "+str(len(_points))+" spilled points; points dropped: "+str(e))
+            return 0
+
+# returns True if InfluxDB refused the points themselves (4xx); sending them again would fail the same way. Connection
+# errors, timeouts, server errors (5xx) and authentication or permission errors (401, 403) are temporary.
+def _rejected(_error):
+    return isinstance(_error, InfluxDBClientError) and _error.code is not None and 400 <= _error.code < 500 and \
+        _error.code not in (401, 403)
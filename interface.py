@@ -25,8 +25,8 @@ import time
 import glob
 import datetime
 import logging
-import RPi.GPIO as GPIO
-import I2C_LCD_driver
+import hardware
+from hardware import GPIO
 
 logger = logging.getLogger('FERMONITOR.INTERFACE')
 logger.setLevel(logging.INFO)
@@ -68,7 +68,7 @@ class Interface (threading.Thread):
         GPIO.setup(PIN_PIR, GPIO.IN)
 
         # Create LCD, passing in MCP GPIO adapter.
-        self.lcd = I2C_LCD_driver.lcd()
+        self.lcd = hardware.createLCD()
         time.sleep(5)
         self.lcd.backlight(0)
         self.bLcdOn = False
@@ -115,7 +115,8 @@ class Interface (threading.Thread):
                 # Reset timeout of display when motion is detected
                 self.lcdOffTime = curTime + datetime.timedelta(seconds=LCD_ON_SEC)
 
-                logger.debug("LCD ON due to detected motion, timeout reset -> PIR_STATE: " + str(self.pir_state) + " bLcdOn: " + str(self.bLcdOn) + " curTime: " + curTime.strftime("%d.%m.%Y %H:%M:%S") + " lcdOffTime: " + self.lcdOffTime.strftime("%d.%m.%Y %H:%M:%S") )
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("LCD ON due to detected motion, timeout reset -> PIR_STATE: %s bLcdOn: %s curTime: %s lcdOffTime: %s", self.pir_state, self.bLcdOn, curTime.strftime("%d.%m.%Y %H:%M:%S"), self.lcdOffTime.strftime("%d.%m.%Y %H:%M:%S"))
 
             # Motion not detected
             else:
@@ -129,17 +130,19 @@ class Interface (threading.Thread):
                         self.lcd.backlight(0)                
                         self.bLcdOn = False
 
-                        logger.debug("Turning LCD OFF -> PIR_STATE: " + str(self.pir_state) + " bLcdOn: " + str(self.bLcdOn) + " curTime: " + curTime.strftime("%d.%m.%Y %H:%M:%S") + " lcdOffTime: " + self.lcdOffTime.strftime("%d.%m.%Y %H:%M:%S") )
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("Turning LCD OFF -> PIR_STATE: %s bLcdOn: %s curTime: %s lcdOffTime: %s", self.pir_state, self.bLcdOn, curTime.strftime("%d.%m.%Y %H:%M:%S"), self.lcdOffTime.strftime("%d.%m.%Y %H:%M:%S"))
 
                     # Display on until timeout expires
                     else:
-                        logger.debug("LCD ON without motion until timeout -> PIR_STATE: " + str(self.pir_state) + " bLcdOn: " + str(self.bLcdOn) + " curTime: " + curTime.strftime("%d.%m.%Y %H:%M:%S") + " lcdOffTime: " + self.lcdOffTime.strftime("%d.%m.%Y %H:%M:%S") )
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("LCD ON without motion until timeout -> PIR_STATE: %s bLcdOn: %s curTime: %s lcdOffTime: %s", self.pir_state, self.bLcdOn, curTime.strftime("%d.%m.%Y %H:%M:%S"), self.lcdOffTime.strftime("%d.%m.%Y %H:%M:%S"))
 
                 # Normal state for LCD to be off when no motion detected
                 else:             
                     self.lcd.backlight(0)                
                     self.bLcdOn = False
-                    logger.debug("LCD remains OFF -> PIR_STATE: " + str(self.pir_state) + " bLcdOn: " + str(self.bLcdOn))
+                    logger.debug("LCD remains OFF -> PIR_STATE: %s bLcdOn: %s", self.pir_state, self.bLcdOn)
 
             try:
 
@@ -180,7 +183,7 @@ class Interface (threading.Thread):
 #                logger.error("Error:", sys.exc_info()[0])
                         
                 # Recreate LCD
-                self.lcd = I2C_LCD_driver.lcd()
+                self.lcd = hardware.createLCD()
                 time.sleep(5)
         
                 self.lcd.lcd_clear()
@@ -0,0 +1,79 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+import math
+
+# Encodes points straight to InfluxDB line protocol bytes, e.g.
+#   fermonitor,host=pi beerTemp=18.1,gravity=1.012,heating=false 1571234567000000000
+# Measurement and tags are escaped once when the encoder is created and field keys are escaped the first time they
+# are seen, so encoding a point only formats the values. Values keep their native type: floats are written as
+# floats, booleans as booleans, integers with the "i" suffix and anything else as quoted string.
+class PointEncoder:
+
+    def __init__(self, _measurement, _tags=None):
+        self.measurement = _measurement
+        prefix = _escape(_measurement, ", ")
+        if _tags is not None:
+            for key in sorted(_tags.keys()):
+                prefix += "," + _escape(key, ",= ") + "=" + _escape(str(_tags[key]), ",= ")
+        self.prefix = prefix.encode('utf8') + b" "
+        self.keys = {}
+
+    # returns line protocol bytes for fields; timestamp in nanoseconds since epoch, defaults to current time.
+    # Fields with value None or non-finite floats are skipped; None is returned if no field is left.
+    def encode(self, _fields, _timestamp=None):
+        parts = []
+        keys = self.keys
+        for name, value in _fields.items():
+            if value is None:
+                continue
+
+            key = keys.get(name)
+            if key is None:
+                key = keys[name] = _escape(name, ",= ") + "="
+
+            if value is True:
+                parts.append(key + "true")
+            elif value is False:
+                parts.append(key + "false")
+            elif isinstance(value, float):
+                if not math.isfinite(value):
+                    continue
+                parts.append(key + repr(value))
+            elif isinstance(value, int):
+                parts.append(key + str(value) + "i")
+            else:
+                parts.append(key + '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"')
+
+        if len(parts) == 0:
+            return None
+
+        if _timestamp is None:
+            _timestamp = time.time_ns()
+
+        return self.prefix + (",".join(parts) + " " + str(_timestamp)).encode('utf8')
+
+def _escape(_value, _chars):
+    _value = _value.replace('\\', '\\\\')
+    for c in _chars:
+        _value = _value.replace(c, '\\' + c)
+    return _value
@@ -0,0 +1,490 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import re
+import glob
+import time
+import threading
+import datetime
+import logging
+from collections import namedtuple
+
+import spikefilter
+import calibration
+
+logger = logging.getLogger('FERMONITOR.ONEWIRE')
+logger.setLevel(logging.INFO)
+
+DEVICES = "/sys/bus/w1/devices/"
+MASTERS = "w1_bus_master*"
+PROBES = "28-*"             # family code of DS18B20
+BULK_READ = "therm_bulk_read"
+RESOLUTION = "resolution"   # w1_therm attribute with resolution of probe in bits (kernel 5.10 and later)
+SAMPLE_INTERVAL = 0.0       # minimum seconds between start of consecutive reads of a probe; 0: as fast as conversion allows
+CONVERSION_TIMEOUT = 2.0    # seconds to wait for a bulk conversion to complete
+POLL_INTERVAL = 0.05        # seconds between checks if a bulk conversion completed
+RESCAN_INTERVAL = 30        # seconds between scans for added or removed probes
+READ_DEADLINE = 1.5         # seconds a read may take; a read in progress for longer is reported as TIMEOUT
+
+# DS18B20 conversion time in seconds by resolution in bits; probes of unknown resolution are assumed at 12 bit
+CONVERSION_TIMES = {9: 0.094, 10: 0.188, 11: 0.375, 12: 0.750}
+DEFAULT_RESOLUTION = 12
+
+# Quality of latest read of a probe
+GOOD = "GOOD"               # latest read succeeded
+CRC = "CRC"                 # latest read failed CRC check
+ERROR = "ERROR"             # latest read failed, e.g. probe removed or bus error
+TIMEOUT = "TIMEOUT"         # a read has been in progress for longer than READ_DEADLINE
+NONE = "NONE"               # probe has not been read successfully yet
+
+# Latest good temperature of a probe with time it was read, its age in seconds and quality of the latest read. temp
+# and age are None until the first successful read.
+Reading = namedtuple('Reading', ['temp', 'time', 'age', 'quality'])
+
+# w1_slave content, e.g.
+#   72 01 4b 46 7f ff 0e 10 57 : crc=57 YES
+#   72 01 4b 46 7f ff 0e 10 57 t=23125
+_W1_SLAVE = re.compile(rb"crc=[0-9a-f]{2} YES\n.*t=(-?[0-9]+)")
+
+# Latest reading and read statistics of a DS18B20 probe. Readings are written by a sampler thread and read by the
+# control loop without blocking; temp is None until the first successful read and after a failed read. Samples pass
+# a spike filter so a single glitch never reaches the control loop. The w1_slave file is opened once and read again
+# from the start for each sample.
+# A read hanging on the bus cannot be interrupted, but it never blocks the control loop: getSample() reports the
+# age of the last good temperature and flags a read exceeding READ_DEADLINE, so the user decides what to do with it.
+class Probe:
+
+    def __init__(self, _id):
+        self.id = _id
+        self.fd = None
+        self.filter = spikefilter.HampelFilter()
+        self.temp = None
+        self.time = None
+        self.lastTemp = None        # latest good temperature, kept after failed reads
+        self.lastGood = None        # monotonic time of latest good temperature
+        self.quality = NONE
+        self.readStart = None       # monotonic time the read in progress started
+        self.timeoutStart = None    # start of read already counted as timeout while it was in progress
+        self.resolution = None      # bits; None if unknown
+        self.reads = 0
+        self.errors = 0
+        self.crcErrors = 0
+        self.timeouts = 0
+        self.lastDuration = None
+        self.totalDuration = 0.0
+        self.maxDuration = 0.0
+
+    # Reads temperature in degrees celcius from probe; blocks during conversion unless a bulk conversion completed.
+    # Returns None if probe cannot be read or CRC check failed.
+    def read(self):
+        self.readStart = time.monotonic()
+        try:
+            if self.fd is None:
+                self.fd = os.open(DEVICES + self.id + "/w1_slave", os.O_RDONLY)
+            match = _W1_SLAVE.search(os.pread(self.fd, 256, 0))
+        except OSError:
+            # probe removed or bus error; file is opened again on next read
+            self.close()
+            self.quality = ERROR
+            return None
+        finally:
+            self.readStart = None
+
+        if match is None:
+            logger.debug("CRC check failed for probe: %s", self.id)
+            self.crcErrors += 1
+            self.quality = CRC
+            return None
+        return int(match.group(1))/1000
+
+    # reads resolution of probe from sysfs; returns bits or None if the kernel does not report it
+    def readResolution(self):
+        try:
+            with open(DEVICES + self.id + "/" + RESOLUTION, 'r') as f:
+                bits = int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+        if bits in CONVERSION_TIMES:
+            self.resolution = bits
+        return self.resolution
+
+    # Sets resolution of probe (9-12 bits). Newer kernels provide a resolution attribute; older ones accept the
+    # resolution written to w1_slave. The resolution is only set in the scratchpad so it is lost when the probe loses
+    # power; the registry sets it again when the probe is found. Returns True if the probe reports the new resolution.
+    def writeResolution(self, _bits):
+        for name in (RESOLUTION, "w1_slave"):
+            path = DEVICES + self.id + "/" + name
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'w') as f:
+                    f.write(str(_bits) + "\n")
+                break
+            except OSError:
+                continue
+        else:
+            return False
+
+        if self.readResolution() is None:
+            # kernel does not report resolution; trust the write
+            self.resolution = _bits
+        return self.resolution == _bits
+
+    # seconds a conversion takes at resolution of the probe
+    def getConversionTime(self):
+        return CONVERSION_TIMES.get(self.resolution, CONVERSION_TIMES[DEFAULT_RESOLUTION])
+
+    # closes file and forgets latest reading of a probe that is no longer connected
+    # forgets readings of an unplugged probe; samples before the unplug must not judge readings after a re-plug
+    def disconnect(self):
+        self.close()
+        self.temp = None
+        self.lastTemp = None
+        self.lastGood = None
+        self.quality = NONE
+        self.filter.reset()
+
+    def close(self):
+        if self.fd is not None:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = None
+
+    # stores result of a read that took duration seconds; temp is None if the read failed
+    def update(self, _temp, _duration):
+        self.reads += 1
+        self.lastDuration = _duration
+        self.totalDuration += _duration
+        if _duration > self.maxDuration:
+            self.maxDuration = _duration
+        # a read that hung is counted by getSample() as soon as it exceeds the deadline
+        if _duration > READ_DEADLINE and self.timeoutStart is None:
+            self.timeouts += 1
+        self.timeoutStart = None
+
+        if _temp is None:
+            self.errors += 1
+            self.temp = None
+            if self.quality == GOOD:
+                self.quality = ERROR
+        else:
+            self.time = datetime.datetime.now()
+            self.temp = self.filter.filter(calibration.apply(calibration.probe(self.id), _temp))
+            self.lastTemp = self.temp
+            self.lastGood = time.monotonic()
+            self.quality = GOOD
+
+    # returns (temperature, time of reading) of latest read; temperature is None if it failed
+    def getReading(self):
+        return self.temp, self.time
+
+    # returns Reading with latest good temperature, its age and quality of the latest read
+    def getSample(self):
+        current = time.monotonic()
+        start = self.readStart
+        quality = TIMEOUT if start is not None and current - start > READ_DEADLINE else self.quality
+        if quality == TIMEOUT and self.timeoutStart != start:
+            self.timeoutStart = start
+            self.timeouts += 1
+        age = current - self.lastGood if self.lastGood is not None else None
+        return Reading(self.lastTemp, self.time, age, quality)
+
+    # returns read statistics; durations in seconds
+    def getStats(self):
+        return {
+            "reads": self.reads,
+            "errors": self.errors,
+            "crcErrors": self.crcErrors,
+            "timeouts": self.timeouts,
+            "quality": self.getSample().quality,
+            "resolution": self.resolution,
+            "conversionTime": self.getConversionTime(),
+            "spikes": self.filter.getSpikes(),
+            "lastDuration": self.lastDuration,
+            "avgDuration": self.totalDuration / self.reads if self.reads > 0 else None,
+            "maxDuration": self.maxDuration}
+
+# Background thread reading a single probe. Reading w1_slave blocks for the conversion time of the probe (94ms at 9
+# bit to 750ms at 12 bit) so every probe has its own sampler; a control cycle then waits for none of them. By default
+# the probe is read again as soon as a read completes, i.e. once per conversion time.
+class ProbeSampler (threading.Thread):
+
+    def __init__(self, _probe, _interval=SAMPLE_INTERVAL):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.stopThread = True
+        self.probe = _probe
+        self.interval = _interval
+
+    def run(self):
+        logger.info("Starting sampler for probe: "+self.probe.id)
+        self.stopThread = False
+
+        while self.stopThread != True:
+            start = time.monotonic()
+            temp = self.probe.read()
+            duration = time.monotonic() - start
+            self.probe.update(temp, duration)
+
+            if duration < self.getPeriod():
+                time.sleep(self.getPeriod() - duration)
+
+        logger.info("Sampler stopped for probe: "+self.probe.id)
+
+    def stop(self):
+        self.stopThread = True
+
+    # returns seconds between readings of the probe
+    def getPeriod(self):
+        return max(self.interval, self.probe.getConversionTime())
+
+# Background thread sampling all probes of one bus master with a single conversion. Writing "trigger" to the
+# master's therm_bulk_read starts the conversion on every probe at once; when it completes each w1_slave returns the
+# converted value without starting a conversion of its own. Sampling N probes costs one conversion time instead of N.
+class BulkSampler (threading.Thread):
+
+    def __init__(self, _master, _probes, _interval=SAMPLE_INTERVAL):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.stopThread = True
+        self.master = _master
+        self.probes = _probes
+        self.interval = _interval
+
+        self.conversions = 0
+        self.timeouts = 0
+        self.lastConversion = None
+
+    def run(self):
+        logger.info("Starting bulk sampler for "+self.master+": "+", ".join(p.id for p in self.probes))
+        self.stopThread = False
+
+        while self.stopThread != True:
+            start = time.monotonic()
+            converted = self._convert()
+
+            for probe in self.probes:
+                readStart = time.monotonic()
+                # without a completed bulk conversion the read falls back to converting this probe on its own
+                temp = probe.read()
+                probe.update(temp, time.monotonic() - readStart if converted else time.monotonic() - start)
+
+            duration = time.monotonic() - start
+            if duration < self.interval:
+                time.sleep(self.interval - duration)
+
+        logger.info("Bulk sampler stopped for "+self.master)
+
+    def stop(self):
+        self.stopThread = True
+
+    # returns seconds between readings of the probes; one conversion of the slowest probe
+    def getPeriod(self):
+        return max([self.interval] + [p.getConversionTime() for p in self.probes])
+
+    # returns statistics of bulk conversions; durations in seconds
+    def getStats(self):
+        return {"conversions": self.conversions, "timeouts": self.timeouts, "lastDuration": self.lastConversion}
+
+    # triggers conversion on all probes of the master and waits for it to complete; returns False on failure
+    def _convert(self):
+        start = time.monotonic()
+        filename = self.master + "/" + BULK_READ
+        try:
+            with open(filename, 'w') as f:
+                f.write("trigger\n")
+
+            # no need to poll before the slowest probe can have completed its conversion
+            time.sleep(max(p.getConversionTime() for p in self.probes))
+
+            # -1: conversion in progress, 1: converted values not read yet, 0: nothing pending
+            while time.monotonic() - start < CONVERSION_TIMEOUT:
+                with open(filename, 'r') as f:
+                    status = f.read().strip()
+                if status != "-1":
+                    self.conversions += 1
+                    self.lastConversion = time.monotonic() - start
+                    return True
+                time.sleep(POLL_INTERVAL)
+
+            self.timeouts += 1
+            logger.warning("Bulk conversion did not complete: "+self.master)
+        except OSError:
+            self.timeouts += 1
+            logger.warning("Unable to trigger bulk conversion: "+self.master)
+        return False
+
+# Creates samplers for probes: one BulkSampler per bus master supporting bulk conversion and a ProbeSampler for every
+# other probe (older kernels, probes not found on any master)
+def createSamplers(_probes, _interval=SAMPLE_INTERVAL):
+    samplers = []
+    remaining = list(_probes)
+
+    for master in sorted(glob.glob(DEVICES + MASTERS)):
+        if not os.path.exists(master + "/" + BULK_READ):
+            continue
+        probes = [p for p in remaining if os.path.exists(master + "/" + p.id)]
+        if len(probes) > 0:
+            samplers.append(BulkSampler(master, probes, _interval))
+            remaining = [p for p in remaining if p not in probes]
+
+    for probe in remaining:
+        samplers.append(ProbeSampler(probe, _interval))
+    return samplers
+
+# Background thread keeping track of the DS18B20 probes connected to the 1-wire bus. Probes are discovered by
+# scanning the sysfs devices and sampled by the samplers created for them; the scan is repeated every RESCAN_INTERVAL
+# so probes can be added or removed without restarting. Probes are looked up by id; mapping ids to roles (beer,
+# chamber, ...) is up to the user of the registry.
+class ProbeRegistry (threading.Thread):
+
+    def __init__(self, _interval=SAMPLE_INTERVAL):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.stopThread = True
+        self.interval = _interval
+        self.lock = threading.Lock()
+        self.probes = {}        # probe id -> Probe; removed probes are kept so their statistics survive re-plugging
+        self.present = []       # ids of probes found by the latest scan
+        self.samplers = []
+        self.resolutions = {}   # probe id -> resolution in bits requested with setResolution()
+        self.pending = set()    # ids of probes whose resolution still has to be written
+
+    def run(self):
+        logger.info("Starting probe registry")
+        self.stopThread = False
+
+        nextScan = 0.0
+        while self.stopThread != True:
+            if time.monotonic() >= nextScan:
+                self.scan()
+                nextScan = time.monotonic() + RESCAN_INTERVAL
+            self._writeResolutions()
+            time.sleep(1)
+
+        for sampler in self.samplers:
+            sampler.stop()
+        for probe in self.probes.values():
+            probe.close()
+        logger.info("Probe registry stopped")
+
+    def stop(self):
+        self.stopThread = True
+
+    # scans for probes and replaces the samplers if probes were added or removed
+    def scan(self):
+        ids = sorted(os.path.basename(path) for path in glob.glob(DEVICES + PROBES))
+        if ids == self.present:
+            return
+
+        added = [id for id in ids if id not in self.present]
+        removed = [id for id in self.present if id not in ids]
+        if len(added) > 0:
+            logger.info("Found probes: "+", ".join(added))
+        if len(removed) > 0:
+            logger.warning("Probes removed: "+", ".join(removed))
+
+        # previous samplers must be finished before new ones read the same probes
+        for sampler in self.samplers:
+            sampler.stop()
+        for sampler in self.samplers:
+            sampler.join(CONVERSION_TIMEOUT + self.interval)
+
+        with self.lock:
+            for id in removed:
+                self.probes[id].disconnect()
+            for id in added:
+                if id not in self.probes:
+                    self.probes[id] = Probe(id)
+                else:
+                    self.probes[id].filter.reset()
+                self.probes[id].resolution = None
+                self.probes[id].readResolution()
+                # a probe that was unplugged lost the resolution set before
+                if id in self.resolutions:
+                    self.pending.add(id)
+            self.present = ids
+
+        # resolution is set before sampling starts so the first readings already use it
+        self._writeResolutions()
+
+        self.samplers = createSamplers([self.probes[id] for id in ids], self.interval)
+        for sampler in self.samplers:
+            sampler.start()
+
+    # returns probe with id or None if it is not connected
+    def getProbe(self, _id):
+        with self.lock:
+            if _id in self.present:
+                return self.probes[_id]
+        return None
+
+    # requests resolution in bits (9-12) for probe; written by the registry thread when the probe is connected
+    def setResolution(self, _id, _bits):
+        if _bits not in CONVERSION_TIMES:
+            raise ValueError("Invalid resolution: "+str(_bits))
+        with self.lock:
+            if self.resolutions.get(_id) != _bits:
+                self.resolutions[_id] = _bits
+                self.pending.add(_id)
+
+    # returns seconds until all probes with ids have a new reading; None if none of them is sampled
+    def getPeriod(self, _ids):
+        periods = []
+        for sampler in self.samplers:
+            probes = sampler.probes if isinstance(sampler, BulkSampler) else [sampler.probe]
+            if any(p.id in _ids for p in probes):
+                periods.append(sampler.getPeriod())
+        return max(periods) if len(periods) > 0 else None
+
+    # returns ids of connected probes
+    def getIds(self):
+        return list(self.present)
+
+    # writes requested resolutions of connected probes; probes keep being read at the previous resolution on failure
+    def _writeResolutions(self):
+        with self.lock:
+            pending = [(id, self.resolutions[id]) for id in self.pending if id in self.present]
+
+        for id, bits in pending:
+            probe = self.probes[id]
+            if probe.resolution == bits or probe.writeResolution(bits):
+                logger.info("Resolution of probe "+id+": "+str(bits)+" bit, conversion time "+str(probe.getConversionTime())+"s")
+            else:
+                logger.warning("Unable to set resolution of probe "+id+" to "+str(bits)+" bit")
+            with self.lock:
+                self.pending.discard(id)
+
+    # returns read statistics of each probe and bulk conversion statistics of each bus master: probe id or bus master
+    # name -> dictionary of counters and durations in seconds
+    def getStats(self):
+        with self.lock:
+            stats = {id: probe.getStats() for id, probe in self.probes.items()}
+        for sampler in self.samplers:
+            if isinstance(sampler, BulkSampler):
+                stats[os.path.basename(sampler.master)] = sampler.getStats()
+        return stats
@@ -0,0 +1,93 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+import logging
+
+logger = logging.getLogger('FERMONITOR.POINTFILTER')
+logger.setLevel(logging.INFO)
+
+DEFAULT_HEARTBEAT = 300     # seconds after which a point is emitted even if nothing changed
+
+# Decides if a point should be written based on how much its fields changed since the last written point. Numeric
+# fields are only considered changed when they moved more than their deadband; fields without a deadband, booleans
+# (relay states) and fields appearing or disappearing always count as a change. A point is also emitted when the
+# heartbeat expires so gaps in the data can be told apart from periods without change.
+class DeadbandFilter:
+
+    def __init__(self, _deadbands=None, _heartbeat=DEFAULT_HEARTBEAT):
+        self.deadbands = {}
+        self.heartbeat = _heartbeat
+        self.lastFields = None
+        self.lastEmitTime = None
+        self.emitted = 0
+        self.suppressed = 0
+        self.setDeadbands(_deadbands)
+
+    # deadbands is dictionary of field name -> minimum change; names are not case sensitive
+    def setDeadbands(self, _deadbands):
+        self.deadbands = {}
+        if _deadbands is not None:
+            for name, value in _deadbands.items():
+                self.deadbands[name.lower()] = float(value)
+
+    def setHeartbeat(self, _heartbeat):
+        self.heartbeat = _heartbeat
+
+    # returns True if point with fields should be written; fields are remembered as last written point
+    def accept(self, _fields):
+        now = time.monotonic()
+
+        if self.lastFields is None or self.lastEmitTime is None or now - self.lastEmitTime >= self.heartbeat or self._changed(_fields):
+            self.lastFields = dict(_fields)
+            self.lastEmitTime = now
+            self.emitted += 1
+            return True
+
+        self.suppressed += 1
+        return False
+
+    def getEmitted(self):
+        return self.emitted
+
+    def getSuppressed(self):
+        return self.suppressed
+
+    def _changed(self, _fields):
+        if _fields.keys() != self.lastFields.keys():
+            return True
+
+        for name, value in _fields.items():
+            last = self.lastFields[name]
+
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                if value != last:
+                    return True
+                continue
+
+            deadband = self.deadbands.get(name.lower())
+            if deadband is None:
+                if value != last:
+                    return True
+            elif abs(value - last) > deadband:
+                return True
+
+        return False
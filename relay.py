@@ -0,0 +1,116 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+import threading
+import collections
+import logging
+
+import dutycycle
+from hardware import GPIO
+
+logger = logging.getLogger('FERMONITOR.RELAY')
+logger.setLevel(logging.INFO)
+
+MAX_TRANSITIONS = 1000      # transitions kept in the log of each relay
+
+# Relay with indicator LED. The pins are only written when the state actually changes; the committed state is kept
+# so repeated requests for the same state cost a comparison. Every transition is logged with a monotonic timestamp.
+# The relay board is active low, the LED active high. On-time is accounted with every set and tick so duty cycle and energy
+# are available without scanning the transition log or history.
+class Relay:
+
+    def __init__(self, _name, _relayPin, _ledPin, _watts=0.0):
+        self.name = _name
+        self.relayPin = _relayPin
+        self.ledPin = _ledPin
+        self.watts = _watts         # power of switched device; 0 if unknown
+        self.lock = threading.Lock()
+        self.state = None           # unknown until first set
+        self.writes = 0
+        self.transitions = collections.deque(maxlen=MAX_TRANSITIONS)   # (monotonic time, state)
+        self.transitionCount = 0
+        self.duty = dutycycle.DutyCycle()
+
+        GPIO.setup(self.relayPin, GPIO.OUT)
+        GPIO.setup(self.ledPin, GPIO.OUT)
+
+    # switches relay and LED on or off; returns True if the state changed
+    def set(self, _on):
+        _on = bool(_on)
+        if _on == self.state:
+            with self.lock:
+                self.duty.update(_on)
+            return False
+
+        with self.lock:
+            # time until now is booked with the previous state
+            self.duty.update(_on)
+            GPIO.output(self.relayPin, GPIO.LOW if _on else GPIO.HIGH)
+            GPIO.output(self.ledPin, GPIO.HIGH if _on else GPIO.LOW)
+            self.writes += 2
+            if self.state is not None:
+                self.transitions.append((time.monotonic(), _on))
+                self.transitionCount += 1
+            self.state = _on
+        return True
+
+    # books time since the latest set or tick with the current state; called every control cycle so duty cycles of a
+    # relay that is not switched stay current
+    def tick(self):
+        if self.state is None:
+            return
+        with self.lock:
+            self.duty.update(self.state)
+
+    def isOn(self):
+        return self.state == True
+
+    # returns logged transitions as list of (monotonic time, state), oldest first
+    def getTransitions(self):
+        with self.lock:
+            return list(self.transitions)
+
+    def setWatts(self, _watts):
+        self.watts = _watts
+
+    def getStats(self):
+        stats = {"on": self.isOn(), "transitions": self.transitionCount, "pinWrites": self.writes}
+        stats.update(self.getDutyStats())
+        return stats
+
+    # returns on-time, cycles, duty cycle and energy of relay; see DutyCycle.getStats
+    def getDutyStats(self):
+        with self.lock:
+            return self.duty.getStats(self.watts)
+
+    # clears lifetime on-time totals, e.g. when a new batch starts
+    def resetDuty(self):
+        with self.lock:
+            self.duty.reset()
+
+    def getDutyCheckpoint(self):
+        with self.lock:
+            return self.duty.getCheckpoint()
+
+    def restoreDuty(self, _data):
+        with self.lock:
+            self.duty.restore(_data)
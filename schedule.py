@@ -0,0 +1,97 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+import bisect
+import datetime
+
+# Shapes of the change from one target temperature to the next
+STEP = "STEP"
+LINEAR = "LINEAR"
+EXPONENTIAL = "EXPONENTIAL"
+
+EXP_TIME_CONSTANTS = 4.0    # exponential ramps cover this many time constants (98%) before snapping to the target
+
+# Compiled fermentation schedule. Target i applies after dates[i] until dates[i+1]; before the first and after the last
+# date there is no target (None). A target can be approached from the previous one with a linear or exponential ramp
+# lasting ramps[i] at the start of its segment instead of a step.
+#
+# Looking up the target is a binary search over the sorted dates. The result is cached together with the period it is
+# valid for, so until the next date is reached a lookup is a single comparison; during a ramp the target is computed
+# from the segment's precomputed start, delta and duration.
+class Schedule:
+
+    def __init__(self, _dates, _temps, _ramps=None, _shapes=None):
+        self.dates = sorted(_dates)
+        self.temps = list(_temps)
+        self.ramps = list(_ramps) if _ramps is not None else []
+        self.shapes = list(_shapes) if _shapes is not None else []
+
+        # per segment: (start, ramp end, previous target, target, shape)
+        self.segments = []
+        for i in range(len(self.dates)-1):
+            temp = self.temps[min(i, len(self.temps)-1)]
+            ramp = self.ramps[i] if i < len(self.ramps) else datetime.timedelta(0)
+            shape = self.shapes[i] if i < len(self.shapes) else (self.shapes[-1] if len(self.shapes) > 0 else LINEAR)
+            if i == 0 or ramp <= datetime.timedelta(0) or shape == STEP:
+                self.segments.append((self.dates[i], self.dates[i], temp, temp, STEP))
+            else:
+                rampEnd = min(self.dates[i] + ramp, self.dates[i+1])
+                self.segments.append((self.dates[i], rampEnd, self.segments[i-1][3], temp, shape))
+
+        self.validFrom = None       # cached target applies after validFrom until validUntil (None: no end)
+        self.validUntil = None
+        self.cached = None
+        self.index = -1
+
+    # returns target temperature at time or None if time is outside the schedule
+    def target(self, _time):
+        if self.validFrom is not None and self.validFrom < _time and (self.validUntil is None or _time <= self.validUntil):
+            return self.cached
+
+        self.index = bisect.bisect_left(self.dates, _time) - 1
+        if self.index < 0:
+            self._cache(None, datetime.datetime.min, self.dates[0] if len(self.dates) > 0 else None)
+            return None
+        if self.index >= len(self.segments):
+            self._cache(None, self.dates[-1], None)
+            return None
+
+        start, rampEnd, previous, temp, shape = self.segments[self.index]
+        if _time >= rampEnd:
+            self._cache(temp, rampEnd, self.dates[self.index+1])
+            return temp
+
+        # within ramp; value changes with every call
+        self.validFrom = None
+        fraction = (_time - start) / (rampEnd - start)
+        if shape == EXPONENTIAL:
+            fraction = (1.0 - math.exp(-EXP_TIME_CONSTANTS * fraction)) / (1.0 - math.exp(-EXP_TIME_CONSTANTS))
+        return previous + (temp - previous) * fraction
+
+    # True if time is before the first date of the schedule
+    def notStarted(self, _time):
+        return len(self.dates) == 0 or _time <= self.dates[0]
+
+    def _cache(self, _target, _from, _until):
+        self.cached = _target
+        self.validFrom = _from
+        self.validUntil = _until
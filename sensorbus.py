@@ -0,0 +1,158 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+import threading
+import logging
+
+logger = logging.getLogger('FERMONITOR.SENSORBUS')
+logger.setLevel(logging.INFO)
+
+# Topics published by the sensor modules
+TOPIC_CHAMBER = "chamber"
+TOPIC_TILT = "tilt"
+
+# Subscription to one or more topics of the sensor bus
+class Subscription:
+
+    def __init__(self, _topics, _callback, _minInterval, _maxInterval):
+        self.topics = _topics
+        self.callback = _callback
+        self.minInterval = _minInterval     # minimum seconds between deliveries; newer data is coalesced
+        self.maxInterval = _maxInterval     # latest data is re-delivered after this many seconds without change
+        self.lastDelivery = None
+        self.seen = {}                      # sequence number of the last delivered data per topic
+
+    # returns monotonic time when subscription should next be delivered or None if nothing is pending
+    def _due(self, _latest):
+        if self.lastDelivery is None:
+            if any(topic in _latest for topic in self.topics):
+                return 0.0
+            return None
+
+        due = None
+        for topic in self.topics:
+            if topic in _latest and _latest[topic][0] != self.seen.get(topic):
+                due = self.lastDelivery + self.minInterval
+                break
+
+        if self.maxInterval is not None:
+            heartbeat = self.lastDelivery + self.maxInterval
+            if due is None or heartbeat < due:
+                due = heartbeat
+
+        return due
+
+# Publish/subscribe bus connecting sensors (Chamber, Tilt) with consumers (InfluxDB, LCD, BrewFather, web). Sensors
+# publish when they have new data and a background thread delivers the latest data of each topic to subscribers,
+# honouring each subscriber's rate limit. Delivery is coalescing: a slow subscriber only ever receives the most recent
+# data and never a backlog.
+class SensorBus (threading.Thread):
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.stopThread = True
+        self.condition = threading.Condition()
+        self.latest = {}            # topic -> (sequence, data)
+        self.sequence = 0
+        self.subscriptions = []
+
+    # Starts the background thread delivering published data
+    def run(self):
+        logger.info("Starting Sensor Bus")
+        self.stopThread = False
+
+        while self.stopThread != True:
+            deliveries = []
+
+            with self.condition:
+                now = time.monotonic()
+                wakeup = None
+
+                for sub in self.subscriptions:
+                    due = sub._due(self.latest)
+                    if due is None:
+                        continue
+                    if due <= now:
+                        data = {}
+                        for topic in sub.topics:
+                            if topic in self.latest:
+                                sub.seen[topic] = self.latest[topic][0]
+                                data[topic] = self.latest[topic][1]
+                        sub.lastDelivery = now
+                        deliveries.append((sub, data))
+                    elif wakeup is None or due < wakeup:
+                        wakeup = due
+
+                if len(deliveries) == 0:
+                    if wakeup is None:
+                        self.condition.wait()
+                    else:
+                        self.condition.wait(wakeup - now)
+
+            # callbacks are called without holding the lock so publishers are never blocked by consumers
+            for sub, data in deliveries:
+                try:
+                    sub.callback(data)
+                except Exception:
+                    logger.exception("Subscriber failed handling data for: "+", ".join(sub.topics))
+
+        logger.info("Sensor Bus Stopped")
+
+    def stop(self):
+        with self.condition:
+            self.stopThread = True
+            self.condition.notify()
+
+    # publishes new data for topic; data should not be modified by publisher afterwards
+    def publish(self, _topic, _data):
+        with self.condition:
+            self.sequence += 1
+            self.latest[_topic] = (self.sequence, _data)
+            self.condition.notify()
+
+    # returns latest data published for topic or None
+    def getLatest(self, _topic):
+        with self.condition:
+            entry = self.latest.get(_topic)
+        if entry is None:
+            return None
+        return entry[1]
+
+    # Registers callback for one or more topics. Callback receives a dictionary of topic -> latest data and is called
+    # at most once per _minInterval seconds. If _maxInterval is set the latest data is re-delivered when nothing new
+    # has been published within that many seconds.
+    def subscribe(self, _topics, _callback, _minInterval=0.0, _maxInterval=None):
+        if isinstance(_topics, str):
+            _topics = [_topics]
+
+        sub = Subscription(list(_topics), _callback, _minInterval, _maxInterval)
+        with self.condition:
+            self.subscriptions.append(sub)
+            self.condition.notify()
+        return sub
+
+    def unsubscribe(self, _sub):
+        with self.condition:
+            if _sub in self.subscriptions:
+                self.subscriptions.remove(_sub)
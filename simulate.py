@@ -0,0 +1,250 @@
+# MIT License
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Runs the chamber control logic against a thermal model on a virtual clock so a whole fermentation schedule takes
+# seconds instead of weeks. Use it to tune BeerTemperatureBuffer, ChamberScaleBuffer and OnDelay of chamber.ini:
+#   python3 simulate.py [--config chamber.ini] [--chamber Chamber] [--days 21] [--step 10] [--csv trace.csv]
+# Chamber._evaluate() is used unmodified; only the clock, the probes and GPIO are replaced.
+
+import math
+import time
+import datetime
+import argparse
+import logging
+
+import hardware
+import configcache
+import onewire
+import chamber
+
+DEGREE = 0.0625                 # resolution of DS18B20 at 12 bit
+
+# Lumped thermal model of beer, chamber air and the fridge around them. Heat flows from ambient through the fridge
+# walls into the chamber air and from the air into the beer; the compressor removes heat from and the heat pad adds
+# heat to the chamber air. Fermentation adds heat to the beer.
+class ThermalModel:
+
+    def __init__(self, _args):
+        self.beerCapacity = _args.beer_litres * 4180.0      # J/K
+        self.airCapacity = _args.air_capacity               # J/K
+        self.beerTransfer = _args.beer_transfer             # W/K beer <-> chamber air
+        self.wallTransfer = _args.wall_transfer             # W/K chamber air <-> ambient
+        self.coolPower = _args.cool_watts
+        self.heatPower = _args.heat_watts
+        self.fermentationPower = _args.fermentation_watts
+        self.ambient = _args.ambient
+        self.ambientSwing = _args.ambient_swing
+
+        self.beerTemp = _args.start_temp
+        self.airTemp = _args.start_temp
+
+    # ambient temperature following a daily cycle, coldest at 4:00
+    def ambientTemp(self, _time):
+        hours = _time.hour + _time.minute / 60
+        return self.ambient - self.ambientSwing * math.cos((hours - 4) / 24 * 2 * math.pi)
+
+    def step(self, _seconds, _time, _heating, _cooling):
+        toBeer = self.beerTransfer * (self.airTemp - self.beerTemp)
+        toAir = self.wallTransfer * (self.ambientTemp(_time) - self.airTemp) - toBeer
+        if _heating:
+            toAir += self.heatPower
+        if _cooling:
+            toAir -= self.coolPower
+
+        self.beerTemp += (toBeer + self.fermentationPower) * _seconds / self.beerCapacity
+        self.airTemp += toAir * _seconds / self.airCapacity
+
+class VirtualClock:
+
+    def __init__(self, _start):
+        self.time = _start
+
+    def now(self):
+        return self.time
+
+    def advance(self, _seconds):
+        self.time += datetime.timedelta(seconds=_seconds)
+
+# Takes the place of the probe registry; readings come from the thermal model quantized like a DS18B20
+class ModelProbes:
+
+    def __init__(self, _ids):
+        self.probes = {id: onewire.Probe(id) for id in _ids}
+
+    def set(self, _id, _temp):
+        self.probes[_id].update(round(_temp / DEGREE) * DEGREE, 0.0)
+
+    def getProbe(self, _id):
+        return self.probes.get(_id)
+
+    def getStats(self):
+        return {id: probe.getStats() for id, probe in self.probes.items()}
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+# Control quality figures collected while the schedule runs
+class Metrics:
+
+    def __init__(self):
+        self.controlled = 0.0       # seconds a target temperature was active
+        self.inBand = 0.0           # seconds beer was within target +/- BeerTemperatureBuffer
+        self.overshoot = 0.0        # largest deviation above target after beer reached the band of that target
+        self.undershoot = 0.0       # largest deviation below target after beer reached the band of that target
+        self.heatCycles = 0
+        self.compressorStarts = 0
+        self.heatSeconds = 0.0
+        self.coolSeconds = 0.0
+        self.shortestRest = None    # shortest time compressor was off between two starts
+
+        self.target = None
+        self.settled = False
+        self.heating = False
+        self.cooling = False
+        self.coolEnd = None
+
+    def record(self, _time, _seconds, _target, _buffer, _beer, _heating, _cooling):
+        if _heating and not self.heating:
+            self.heatCycles += 1
+        if _cooling and not self.cooling:
+            self.compressorStarts += 1
+            if self.coolEnd is not None:
+                rest = (_time - self.coolEnd).total_seconds()
+                if self.shortestRest is None or rest < self.shortestRest:
+                    self.shortestRest = rest
+        if self.cooling and not _cooling:
+            self.coolEnd = _time
+        self.heating = _heating
+        self.cooling = _cooling
+
+        if _heating:
+            self.heatSeconds += _seconds
+        if _cooling:
+            self.coolSeconds += _seconds
+
+        if _target == chamber.DEFAULT_TEMP:
+            self.target = None
+            return
+
+        if _target != self.target:
+            self.target = _target
+            self.settled = False
+
+        self.controlled += _seconds
+        if abs(_beer - _target) <= _buffer:
+            self.inBand += _seconds
+            self.settled = True
+
+        if self.settled:
+            self.overshoot = max(self.overshoot, _beer - _target)
+            self.undershoot = max(self.undershoot, _target - _beer)
+
+    def report(self, _days):
+        print("time in band:       {:6.1f} %".format(self.inBand / self.controlled * 100 if self.controlled > 0 else 0.0))
+        print("overshoot:          {:6.2f} C above / {:.2f} C below target".format(self.overshoot, self.undershoot))
+        print("heating cycles:     {:6d} ({:.1f} h on)".format(self.heatCycles, self.heatSeconds / 3600))
+        print("compressor starts:  {:6d} ({:.1f} per day, {:.1f} h on)".format(self.compressorStarts, self.compressorStarts / _days, self.coolSeconds / 3600))
+        print("relay cycles:       {:6d}".format(self.heatCycles + self.compressorStarts))
+        if self.shortestRest is not None:
+            print("shortest rest:      {:6.1f} min between compressor runs".format(self.shortestRest / 60))
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description="Simulate chamber control of a fermentation schedule")
+    parser.add_argument("--config", default=chamber.CONFIGFILE, help="chamber configuration with schedule and buffers")
+    parser.add_argument("--chamber", default=chamber.SECTION, help="section of chamber to simulate")
+    parser.add_argument("--days", type=float, default=21, help="simulated days from first date of schedule")
+    parser.add_argument("--step", type=float, default=10, help="simulated seconds per control cycle")
+    parser.add_argument("--csv", help="write trace of temperatures and relays to file")
+    parser.add_argument("--csv-interval", type=float, default=300, help="seconds between rows of trace")
+    parser.add_argument("--start-temp", type=float, default=20.0, help="initial beer and chamber temperature")
+    parser.add_argument("--ambient", type=float, default=20.0, help="average room temperature")
+    parser.add_argument("--ambient-swing", type=float, default=2.0, help="daily +/- change of room temperature")
+    parser.add_argument("--beer-litres", type=float, default=20.0)
+    parser.add_argument("--air-capacity", type=float, default=15000.0, help="J/K of chamber air and fridge interior")
+    parser.add_argument("--beer-transfer", type=float, default=4.0, help="W/K between beer and chamber air")
+    parser.add_argument("--wall-transfer", type=float, default=1.2, help="W/K between chamber air and room")
+    parser.add_argument("--cool-watts", type=float, default=80.0, help="heat removed by compressor")
+    parser.add_argument("--heat-watts", type=float, default=40.0, help="heat added by heat pad")
+    parser.add_argument("--fermentation-watts", type=float, default=0.0, help="heat produced by fermentation")
+    return parser.parse_args()
+
+def main():
+    args = parseArgs()
+    logging.basicConfig(level=logging.WARNING)
+
+    hardware.select(hardware.SIMULATED)
+    configs = configcache.register(args.config, chamber._parseConf).get()
+    if configs is None or args.chamber not in configs:
+        print("Unable to read "+args.chamber+" from: "+args.config)
+        return
+    config = configs[args.chamber]
+    chamber._config = configcache.register(args.config, chamber._parseConf)
+
+    # start an hour before the first date so the chamber settles
+    clock = VirtualClock(config.tempDates[0] - datetime.timedelta(hours=1))
+    end = clock.now() + datetime.timedelta(days=args.days)
+    chamber.now = clock.now
+
+    fridge = chamber.Chamber(None, None, args.chamber)
+    fridge._readConf()
+    chamber.logger.setLevel(logging.WARNING)
+    probes = ModelProbes([config.beerProbe, config.chamberProbe])
+    fridge.probes = probes
+
+    model = ThermalModel(args)
+    metrics = Metrics()
+    trace = open(args.csv, "w") if args.csv else None
+    if trace is not None:
+        trace.write("time,target,beer,chamber,ambient,heating,cooling\n")
+    nextRow = clock.now()
+
+    start = time.perf_counter()
+    cycles = 0
+    while clock.now() < end:
+        model.step(args.step, clock.now(), fridge.bHeatOn, fridge.bCoolOn)
+        clock.advance(args.step)
+        probes.set(config.beerProbe, model.beerTemp)
+        probes.set(config.chamberProbe, model.airTemp)
+
+        fridge._evaluate()
+        cycles += 1
+        metrics.record(clock.now(), args.step, fridge.targetTemp, fridge.bufferBeerTemp, model.beerTemp, fridge.bHeatOn, fridge.bCoolOn)
+
+        if trace is not None and clock.now() >= nextRow:
+            trace.write("{},{},{:.3f},{:.3f},{:.2f},{},{}\n".format(clock.now().strftime("%Y-%m-%d %H:%M:%S"),
+                fridge.targetTemp if fridge.targetTemp != chamber.DEFAULT_TEMP else "", model.beerTemp, model.airTemp,
+                model.ambientTemp(clock.now()), int(fridge.bHeatOn), int(fridge.bCoolOn)))
+            nextRow = clock.now() + datetime.timedelta(seconds=args.csv_interval)
+
+    elapsed = time.perf_counter() - start
+    if trace is not None:
+        trace.close()
+
+    print("simulated {:.1f} days in {:.1f} s ({:d} control cycles, {:.0f}x real time)".format(args.days, elapsed, cycles, args.days*86400/elapsed))
+    metrics.report(args.days)
+    hardware.backend().w1.cleanup()
+
+if __name__ == "__main__": #dont run this as a module
+    main()
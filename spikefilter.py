@@ -0,0 +1,66 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import collections
+
+WINDOW = 5              # samples the median is taken over; up to WINDOW//2 consecutive spikes are rejected
+THRESHOLD = 3.0         # samples further than THRESHOLD scaled median absolute deviations from the median are spikes
+MIN_DEVIATION = 1.0     # smallest deviation from the median treated as spike; steady readings have no deviation
+MAD_SCALE = 1.4826      # scales median absolute deviation to standard deviation of normally distributed noise
+
+# Hampel filter rejecting single glitches (e.g. 85C power-on value or bit errors of a 1-wire probe) from a stream of
+# samples. Each sample is compared with the median of the last WINDOW samples held in a ring buffer; spikes are
+# replaced by the median, any other sample is passed through unchanged so real changes are not delayed. A real step
+# change is accepted once it makes up the majority of the window. Work per sample is constant.
+class HampelFilter:
+
+    def __init__(self, _window=WINDOW, _threshold=THRESHOLD, _minDeviation=MIN_DEVIATION):
+        self.samples = collections.deque(maxlen=_window)
+        self.threshold = _threshold
+        self.minDeviation = _minDeviation
+        self.spikes = 0
+
+    # adds sample and returns filtered value
+    def filter(self, _value):
+        self.samples.append(_value)
+        if len(self.samples) < 3:
+            return _value
+
+        median = _median(self.samples)
+        deviation = max(self.threshold * MAD_SCALE * _median([abs(x - median) for x in self.samples]), self.minDeviation)
+
+        if abs(_value - median) > deviation:
+            self.spikes += 1
+            return median
+        return _value
+
+    def getSpikes(self):
+        return self.spikes
+
+    def reset(self):
+        self.samples.clear()
+
+def _median(_values):
+    values = sorted(_values)
+    middle = len(values) // 2
+    if len(values) % 2 == 1:
+        return values[middle]
+    return (values[middle-1] + values[middle]) / 2
@@ -0,0 +1,147 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import json
+import time
+import datetime
+import threading
+import logging
+
+logger = logging.getLogger('FERMONITOR.STATEFILE')
+logger.setLevel(logging.INFO)
+
+STATEFILE = "fermonitor.state"
+CHECKPOINT_INTERVAL = 60    # seconds between periodic checkpoints
+MIN_INTERVAL = 1.0          # minimum seconds between checkpoints requested by checkpoint()
+
+# State of components that has to survive a restart, e.g. on delay timers protecting the compressor, latest readings
+# and time of last BrewFather update. Components register a callback returning their state as JSON serializable
+# dictionary and get the state saved by the previous run from restore(). The file is written by a background thread
+# periodically and soon after checkpoint() is called; it is written to a temporary file which then replaces the state
+# file, so a crash or power loss leaves either the previous or the new state but never a partial file.
+class StateFile (threading.Thread):
+
+    def __init__(self, _filename=STATEFILE, _interval=CHECKPOINT_INTERVAL):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.stopThread = True
+        self.filename = _filename
+        self.interval = _interval
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.providers = {}             # name -> callback returning state of component
+        self.restored = self._load()
+        self.saves = 0
+        self.errors = 0
+        self.lastDuration = None
+
+    def run(self):
+        logger.info("Starting State File")
+        self.stopThread = False
+
+        while self.stopThread != True:
+            self.event.wait(self.interval)
+            self.event.clear()
+            self.save()
+            time.sleep(MIN_INTERVAL)
+
+        self.save()
+        logger.info("State File Stopped")
+
+    def stop(self):
+        self.stopThread = True
+        self.event.set()
+
+    # returns state saved for component by the previous run; None if there is none
+    def restore(self, _name):
+        return self.restored.get(_name)
+
+    # callback is called with no arguments whenever the state is saved and returns the state of component
+    def register(self, _name, _callback):
+        with self.lock:
+            self.providers[_name] = _callback
+
+    # requests the state to be saved soon, e.g. after a relay changed; never blocks the caller
+    def checkpoint(self, _data=None):
+        self.event.set()
+
+    # collects state of all components and replaces the state file
+    def save(self):
+        start = time.monotonic()
+        with self.lock:
+            providers = list(self.providers.items())
+
+        # components that are not registered (yet) keep their state from the previous run
+        state = dict(self.restored)
+        for name, callback in providers:
+            try:
+                state[name] = callback()
+            except Exception:
+                logger.exception("Problem collecting state of: "+name)
+
+        state["saved"] = datetime.datetime.now().isoformat()
+        temp = self.filename + ".tmp"
+        try:
+            with open(temp, 'w') as f:
+                json.dump(state, f, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp, self.filename)
+            self.saves += 1
+        except (OSError, TypeError, ValueError):
+            self.errors += 1
+            logger.exception("Unable to write state file: "+self.filename)
+        self.lastDuration = time.monotonic() - start
+
+    # returns number of saves, failed saves and duration of latest save in seconds
+    def getStats(self):
+        return {"saves": self.saves, "errors": self.errors, "lastDuration": self.lastDuration}
+
+    def _load(self):
+        try:
+            with open(self.filename, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            logger.exception("Unable to read state file; starting without saved state: "+self.filename)
+            return {}
+
+        if not isinstance(state, dict):
+            return {}
+        logger.info("Restored state saved: "+str(state.get("saved")))
+        return state
+
+# converts datetime to string stored in state file
+def encodeTime(_time):
+    if isinstance(_time, datetime.datetime):
+        return _time.isoformat()
+    return None
+
+# converts string from state file to datetime; None if it is missing or invalid
+def decodeTime(_value):
+    try:
+        return datetime.datetime.fromisoformat(_value)
+    except (TypeError, ValueError):
+        return None
@@ -29,6 +29,7 @@ from setup_logger import logger
 from distutils.util import strtobool
 
 import chamber
+import hardware
 
 logger = logging.getLogger('TEST_CHAMBER')
 logger.setLevel(logging.DEBUG)
@@ -52,6 +53,12 @@ def main():
 if __name__ == "__main__": #dont run this as a module
 
     try:
+        # run without Pi hardware: python3 test_chamber.py --simulated
+        if "--simulated" in sys.argv:
+            hardware.select(hardware.SIMULATED)
+            hardware.backend().w1.setTemp(chamber.DEFAULT_BEER_PROBE, 20.0)
+            hardware.backend().w1.setTemp(chamber.DEFAULT_CHAMBER_PROBE, 15.0)
+
         main()
 
     except KeyboardInterrupt:
@@ -24,12 +24,15 @@
 # import datetime
 # import time
 # import os
+import sys
+import time
 import random
 import logging
 from setup_logger import logger
 # from distutils.util import strtobool
 
 import interface
+import hardware
 
 logger = logging.getLogger('TEST_INTERFACE')
 logger.setLevel(logging.INFO)
@@ -65,6 +68,10 @@ def main():
 if __name__ == "__main__": #dont run this as a module
 
     try:
+        # run without Pi hardware: python3 test_interface.py --simulated
+        if "--simulated" in sys.argv:
+            hardware.select(hardware.SIMULATED)
+
         main()
 
     except KeyboardInterrupt:
@@ -23,15 +23,17 @@
 # blescan.py found on the same page 
 # https://www.instructables.com/id/Reading-a-Tilt-Hydrometer-With-a-Raspberry-Pi/
 
-import blescan
+import sensorbus
 from datetime import datetime, timedelta
 import time
-import os
-import bluetooth._bluetooth as bluez
 import threading
 import logging
-import configparser
-from distutils.util import strtobool
+from collections import namedtuple
+
+import configcache
+import hardware
+import statefile
+import calibration
 
 logger = logging.getLogger('FERMONITOR.TILT')
 logger.setLevel(logging.INFO)
@@ -83,11 +85,14 @@ class Tilt (threading.Thread):
 
 
     # Constructor for class
-    def __init__(self):
+    def __init__(self, _bus=None):
         threading.Thread.__init__(self)
         self.stopThread = True    
+        self.bus = _bus                     # sensor bus new readings are published to; optional
         self.bluetoothDeviceId = DEFAULT_BT_DEVICE_ID
+        self.config = None
         self.data = {}
+        self.version = 0                    # incremented whenever new data is stored
         self._readConf()
 
 
@@ -113,6 +118,28 @@ class Tilt (threading.Thread):
         return self.data.copy()
 
 
+    # returns latest data of each color to be saved for a restart
+    def getCheckpoint(self):
+        return {color: {TEMP: data.get(TEMP), SG: data.get(SG), TIME: statefile.encodeTime(data.get(TIME))} for color, data in self.getAllData().items()}
+
+    # applies data saved by getCheckpoint() before a restart until the first scan completes; readings keep their
+    # time so the chamber still ignores them once outdated
+    def restore(self, _data):
+        if not isinstance(_data, dict) or len(self.data) > 0:
+            return
+
+        _restored = {}
+        for color, data in _data.items():
+            _time = statefile.decodeTime(data.get(TIME))
+            if validColor(color) and _time is not None:
+                _restored[color] = {COLOR: color, TEMP: data.get(TEMP), SG: data.get(SG), TIME: _time}
+        self.data = _restored
+        self.version += 1
+
+    # version of data; changes with every completed scan
+    def getVersion(self):
+        return self.version
+
     # return a copy of the data for a specific color tilt
     def getData(self, _color):
         if self.data.get(_color) != None and len(self.data[_color]) > 0:
@@ -128,19 +155,18 @@ class Tilt (threading.Thread):
 
         logger.debug("Connecting to Bluetooth...")
         try:
-            sock = bluez.hci_open_dev(self.bluetoothDeviceId)
+            scanner = hardware.openBLE(self.bluetoothDeviceId)
 
         except:
             logger.exception("Error accessing bluetooth device...")
             return False
 
-        blescan.hci_le_set_scan_parameters(sock)
-        blescan.hci_enable_le_scan(sock)
+        scanner.start()
 
         _data = {}
     
         while (datetime.now() < timeout):
-            returnedList = blescan.parse_events(sock, 10)
+            returnedList = scanner.read(10)
 
             curTime = datetime.now()
 
@@ -161,6 +187,9 @@ class Tilt (threading.Thread):
                     if  foundTemp > 200:  # first reading always showed temperature of 537.2C and SG 1.0
                         logger.debug("Skipping initial datasets as temp and SG are always wrong")
                     else:
+                        # curves of calibration.ini correct raw readings, e.g. against a refractometer
+                        foundTemp = calibration.apply(calibration.tiltTemp(foundColor), foundTemp)
+                        foundSG = calibration.apply(calibration.tiltSG(foundColor), foundSG)
                         _data[foundColor] = {COLOR: foundColor, TEMP: round(float(foundTemp),1), SG: round(float(foundSG),3), TIME:curTime}
                         logger.debug(foundColor+" - "+curTime.strftime(DATETIME_FORMAT)+" - T:"+str(round(float(foundTemp),1))+" - SG:"+"{:5.3f}".format(round(float(foundSG),3)))
 
@@ -172,54 +201,51 @@ class Tilt (threading.Thread):
         
         self.data.clear()
         self.data = _data
+        self.version += 1
 
-        blescan.hci_disable_le_scan(sock)
+        if self.bus is not None and len(_data) > 0:
+            self.bus.publish(sensorbus.TOPIC_TILT, self.getAllData())
+
+        scanner.stop()
         return True
         
 
+    # Applies configuration from tilt.ini. File is only parsed again when it has been modified.
     def _readConf(self):
-    
-        bDefaultBtDeviceId = True
-        
-        if os.path.isfile(CONFIGFILE) == False:
-            logger.error("Tilt configuration file is not valid: "+CONFIGFILE)
-        else:
-            ini = configparser.ConfigParser()
-            try:
-                logger.debug("Reading Tilt config: " + CONFIGFILE)
-                ini.read(CONFIGFILE)
-
-                if CONFIGSECTION in ini:
-                    config = ini[CONFIGSECTION]
-
-                    try:
-                        if config["BluetoothDeviceId"] != "" and int(config["BluetoothDeviceId"]) >= 0:
-                            self.bluetoothDeviceId = int(config.get("BluetoothDeviceId"))
-                            bDefaultBtDeviceId = False
-                        else:
-                            self.bluetoothDeviceId = 0
-                            logger.warning("Problem reading BluetoothDeviceId from configuration file; using default")
-                    except KeyError:
-                        logger.warning("Problem reading BluetoothDeviceId from configuration file; using default")
-                        pass
-
-                    try:
-                        if config["MessageLevel"] == "DEBUG":
-                            logger.setLevel(logging.DEBUG)
-                        elif config["MessageLevel"] == "WARNING":
-                            logger.setLevel(logging.WARNING)
-                        elif config["MessageLevel"] == "ERROR":
-                            logger.setLevel(logging.ERROR)
-                        elif config["MessageLevel"] == "INFO":
-                            logger.setLevel(logging.INFO)
-                        else:
-                            logger.setLevel(logging.INFO)
-                    except KeyError:
-                        logger.warning("Problem reading MessageLevel from configuration file; using default")
-                        logger.setLevel(logging.INFO)
-                else:
-                    logger.error("["+CONFIGSECTION+"] section not found in ini file: " + CONFIGFILE)
-            except:
-                logger.error("Problem reading configuration file: "+CONFIGFILE)
-    
+        config = _config.get()
+
+        if config is None or config is self.config:
+            return
+
+        self.config = config
+        logger.setLevel(config.messageLevel)
+        self.bluetoothDeviceId = config.bluetoothDeviceId
+
+# Immutable Tilt configuration
+TiltConfig = namedtuple('TiltConfig', ['messageLevel', 'bluetoothDeviceId'])
 
+def _parseConf(ini):
+
+    bluetoothDeviceId = DEFAULT_BT_DEVICE_ID
+    level = logging.INFO
+
+    if CONFIGSECTION in ini:
+        config = ini[CONFIGSECTION]
+
+        try:
+            if config["BluetoothDeviceId"] != "" and int(config["BluetoothDeviceId"]) >= 0:
+                bluetoothDeviceId = int(config.get("BluetoothDeviceId"))
+            else:
+                logger.warning("Problem reading BluetoothDeviceId from configuration file; using default")
+        except KeyError:
+            logger.warning("Problem reading BluetoothDeviceId from configuration file; using default")
+
+        if "MessageLevel" not in config:
+            logger.warning("Problem reading MessageLevel from configuration file; using default")
+        level = configcache.messageLevel(config)
+    else:
+        logger.error("["+CONFIGSECTION+"] section not found in ini file: " + CONFIGFILE)
+
+    return TiltConfig(level, bluetoothDeviceId)
+
+_config = configcache.register(CONFIGFILE, _parseConf)
@@ -0,0 +1,186 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+import threading
+import logging
+import collections
+from collections import namedtuple
+
+from werkzeug.serving import make_server
+
+# waitress is only needed for the production server mode
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+logger = logging.getLogger('FERMONITOR.WEBSERVER')
+logger.setLevel(logging.INFO)
+
+SERVER_DEVELOPMENT = "DEVELOPMENT"
+SERVER_WAITRESS = "WAITRESS"
+
+DEFAULT_HOST = "0.0.0.0"
+DEFAULT_PORT = 5000
+DEFAULT_THREADS = 4             # worker threads handling requests
+DEFAULT_CONNECTION_LIMIT = 32   # open connections accepted before new ones wait in the listen backlog
+DEFAULT_BACKLOG = 64            # pending connections queued by the OS
+DEFAULT_CHANNEL_TIMEOUT = 30    # seconds an idle keep-alive connection is kept open
+DEFAULT_MAX_STREAMS = 2         # concurrent Server-Sent Events streams; each holds a worker thread
+
+RATE_WINDOW = 60                # seconds requests per second is averaged over
+
+# Immutable web server configuration; changes require restart
+WebConfig = namedtuple('WebConfig', ['server', 'host', 'port', 'threads', 'connectionLimit', 'backlog', 'channelTimeout', 'maxStreams'])
+
+DEFAULT_CONFIG = WebConfig(SERVER_DEVELOPMENT, DEFAULT_HOST, DEFAULT_PORT, DEFAULT_THREADS, DEFAULT_CONNECTION_LIMIT, DEFAULT_BACKLOG, DEFAULT_CHANNEL_TIMEOUT, DEFAULT_MAX_STREAMS)
+
+# Reads [Web] section of configuration; missing or invalid values use defaults
+def parseConfig(ini):
+    if 'Web' not in ini:
+        return DEFAULT_CONFIG
+    config = ini['Web']
+
+    server = config.get("Server", SERVER_DEVELOPMENT)
+    if server not in (SERVER_DEVELOPMENT, SERVER_WAITRESS):
+        logger.warning("Invalid Web Server configuration; using default: "+SERVER_DEVELOPMENT)
+        server = SERVER_DEVELOPMENT
+
+    host = config.get("Host", DEFAULT_HOST)
+    if host == "":
+        host = DEFAULT_HOST
+
+    values = []
+    for key, default in (("Port", DEFAULT_PORT), ("Threads", DEFAULT_THREADS), ("ConnectionLimit", DEFAULT_CONNECTION_LIMIT),
+            ("Backlog", DEFAULT_BACKLOG), ("ChannelTimeout", DEFAULT_CHANNEL_TIMEOUT), ("MaxStreams", DEFAULT_MAX_STREAMS)):
+        value = default
+        try:
+            if key in config:
+                if int(config[key]) > 0:
+                    value = int(config[key])
+                else:
+                    raise Exception
+        except:
+            logger.warning("Invalid Web "+key+" configuration; using default: "+str(default))
+        values.append(value)
+
+    return WebConfig(server, host, *values)
+
+# Counts requests and their processing time. Requests per second are averaged over the last RATE_WINDOW seconds.
+class RequestStats:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.totalTime = 0.0
+        self.maxTime = 0.0
+        self.window = collections.deque()   # (second, requests finished in that second)
+
+    # records a finished request that took duration seconds
+    def record(self, _duration):
+        second = int(time.monotonic())
+        with self.lock:
+            self.requests += 1
+            self.totalTime += _duration
+            if _duration > self.maxTime:
+                self.maxTime = _duration
+
+            if len(self.window) > 0 and self.window[-1][0] == second:
+                self.window[-1][1] += 1
+            else:
+                self.window.append([second, 1])
+            self._expire(second)
+
+    def getRequests(self):
+        return self.requests
+
+    # average and maximum processing time in seconds
+    def getAvgDuration(self):
+        if self.requests == 0:
+            return None
+        return self.totalTime / self.requests
+
+    def getMaxDuration(self):
+        return self.maxTime
+
+    def getRequestsPerSecond(self):
+        with self.lock:
+            self._expire(int(time.monotonic()))
+            return sum(count for second, count in self.window) / RATE_WINDOW
+
+    def _expire(self, _second):
+        while len(self.window) > 0 and self.window[0][0] <= _second - RATE_WINDOW:
+            self.window.popleft()
+
+# Thread serving the Flask app. In WAITRESS mode requests are handled by a fixed pool of worker threads with a
+# limit on open connections and HTTP/1.1 keep-alive, so a burst of requests queues up instead of creating a thread per
+# request that competes with the control loop for the interpreter. DEVELOPMENT mode uses Flask's built-in server and is
+# also used when waitress is not installed.
+class WebServer (threading.Thread):
+
+    def __init__(self, _app, _config=DEFAULT_CONFIG):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.app = _app
+        self.config = _config
+        self.server = None
+        self.useWaitress = _config.server == SERVER_WAITRESS and waitress is not None
+        self.streams = threading.BoundedSemaphore(_config.maxStreams)
+
+    def run(self):
+        config = self.config
+        if config.server == SERVER_WAITRESS and waitress is None:
+            logger.error("waitress not installed; using development web server")
+
+        if self.useWaitress:
+            logger.info("Starting waitress web server on port "+str(config.port)+" with "+str(config.threads)+" threads")
+            self.server = waitress.create_server(self.app, host=config.host, port=config.port, threads=config.threads,
+                connection_limit=config.connectionLimit, backlog=config.backlog, channel_timeout=config.channelTimeout,
+                ident="fermonitor")
+        else:
+            logger.info("Starting development web server on port "+str(config.port))
+            self.server = make_server(config.host, config.port, self.app, threaded=True)
+
+        try:
+            if self.useWaitress:
+                self.server.run()
+            else:
+                self.server.serve_forever()
+        except:
+            logger.exception("Web server stopped with error")
+        logger.info("Web Server Stopped")
+
+    def stop(self):
+        if self.server is None:
+            return
+        if self.useWaitress:
+            self.server.close()
+        else:
+            self.server.shutdown()
+
+    # reserves a slot for a long running stream; returns False if MaxStreams streams are already open
+    def acquireStream(self):
+        return self.streams.acquire(blocking=False)
+
+    def releaseStream(self):
+        self.streams.release()
@@ -0,0 +1,198 @@
+#
+# Copyright (c) 2019 Michael Schmidt
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import gzip
+import datetime
+import threading
+import logging
+
+import tilt
+
+logger = logging.getLogger('FERMONITOR.WEBSTATE')
+logger.setLevel(logging.INFO)
+
+CHAMBER = "chamber"
+TILT = "tilt"
+BREWFATHER = "brewfather"
+CHAMBERS = "chambers"
+
+# Serializable state of chamber, Tilt and BrewFather for the web API. The state is only rebuilt and serialized when
+# the version of one of the sources changes, so repeated requests reuse the cached JSON. Threads waiting for changes
+# (e.g. Server-Sent Events streams) are woken by notify(), which is subscribed to the sensor bus.
+class WebState:
+
+    def __init__(self):
+        self.chamber = None
+        self.tilt = None
+        self.brewfather = None
+        self.tiltColor = None
+        self.chambers = []          # further chambers controlled besides chamber
+        self.nonce = format(int(datetime.datetime.now().timestamp() * 1000), 'x')  # versions restart at 0 with the process
+
+        self.condition = threading.Condition()
+        self.cacheKey = None
+        self.cacheState = None
+        self.cacheJSON = None
+
+    def attach(self, _chamber, _tilt, _brewfather, _chambers=None):
+        self.chamber = _chamber
+        self.tilt = _tilt
+        self.brewfather = _brewfather
+        self.chambers = [c for c in (_chambers or []) if c is not _chamber]
+        self.notify()
+
+    def setTiltColor(self, _color):
+        if _color != self.tiltColor:
+            self.tiltColor = _color
+            self.notify()
+
+    # key identifying current state; changes whenever any part of the state changes
+    def getKey(self):
+        return (
+            self.chamber.getVersion() if self.chamber is not None else 0,
+            self.chamber.getConfigVersion() if self.chamber is not None else 0,
+            self.tilt.getVersion() if self.tilt is not None else 0,
+            self.brewfather.getVersion() if self.brewfather is not None else 0,
+            self.tiltColor) + tuple(c.getVersion() for c in self.chambers)
+
+    # entity tag for HTTP caching of state with key; includes start of the process so content cached before a restart
+    # never matches
+    def getETag(self, _key):
+        return self.nonce + "-" + "-".join(str(x) for x in _key)
+
+    # returns key, state dictionary and JSON bytes; rebuilt only when key changed
+    def getState(self):
+        key = self.getKey()
+        with self.condition:
+            if key != self.cacheKey:
+                self.cacheState = self._build()
+                self.cacheJSON = json.dumps(self.cacheState, separators=(',', ':')).encode('utf8')
+                self.cacheKey = key
+            return self.cacheKey, self.cacheState, self.cacheJSON
+
+    # wakes threads waiting for state changes; accepts and ignores sensor bus data
+    def notify(self, _data=None):
+        with self.condition:
+            self.condition.notify_all()
+
+    # blocks until key differs from _key or timeout expires; returns current key
+    def wait(self, _key, _timeout):
+        with self.condition:
+            if self.getKey() == _key:
+                self.condition.wait(_timeout)
+        return self.getKey()
+
+    def _build(self):
+        state = {CHAMBER: {}, TILT: {}, BREWFATHER: {}}
+
+        if self.chamber is not None:
+            state[CHAMBER] = self._chamberData(self.chamber)
+
+        if len(self.chambers) > 0:
+            state[CHAMBERS] = {c.name: self._chamberData(c) for c in self.chambers}
+
+        if self.tilt is not None and self.tiltColor is not None:
+            for color, data in self.tilt.getAllData().items():
+                state[TILT][color] = {"temp": data.get(tilt.TEMP), "sg": data.get(tilt.SG), "time": _isoformat(data.get(tilt.TIME))}
+
+        if self.brewfather is not None:
+            state[BREWFATHER] = {
+                "lastUpdate": _isoformat(self.brewfather.getLastRequestTime()),
+                "last": _decode(self.brewfather.getLastJSON()),
+                "next": _decode(self.brewfather.getNextJSON())}
+
+        return state
+
+    def _chamberData(self, _chamber):
+        snapshot = _chamber.snapshot()
+        chamberdata = snapshot._asdict()
+        chamberdata["time"] = _isoformat(snapshot.time)
+        chamberdata["tiltColor"] = _chamber.getTiltColor() if snapshot.tiltControlled else None
+        chamberdata["dates"] = [_isoformat(item) for item in _chamber.getDates()]
+        chamberdata["temps"] = _chamber.getTemps()
+        return chamberdata
+
+# Cache of a rendered page and its gzip compressed form. The page is rendered again only when the key (see
+# WebState.getKey) changes so repeated requests cost a dictionary lookup. Values not covered by the key, such as the
+# time of the latest reading while temperatures are steady, can be shown stale until the key changes.
+class RenderCache:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pages = {}         # name -> (key, html bytes, gzip bytes)
+        self.hits = 0
+        self.misses = 0
+
+    # returns (html, gzipped html) of page; _render is called to create the html when key changed
+    def get(self, _name, _key, _render):
+        with self.lock:
+            entry = self.pages.get(_name)
+            if entry is not None and entry[0] == _key:
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+
+        html = _render()
+        if isinstance(html, str):
+            html = html.encode('utf8')
+        entry = (_key, html, gzip.compress(html, 6))
+
+        with self.lock:
+            self.pages[_name] = entry
+        return entry[1], entry[2]
+
+    def getHits(self):
+        return self.hits
+
+    def getMisses(self):
+        return self.misses
+
+# Returns changes from _old to _new state: sections and keys that changed, None for keys that were removed
+def delta(_old, _new):
+    changes = {}
+    for section, values in _new.items():
+        previous = _old.get(section, {})
+        changed = {}
+        for key, value in values.items():
+            if key not in previous or previous[key] != value:
+                changed[key] = value
+        for key in previous.keys():
+            if key not in values:
+                changed[key] = None
+        if len(changed) > 0:
+            changes[section] = changed
+    return changes
+
+def _isoformat(_time):
+    if isinstance(_time, datetime.datetime):
+        return _time.isoformat()
+    return _time
+
+def _decode(_json):
+    if isinstance(_json, bytes):
+        _json = _json.decode('utf8')
+    if _json == "":
+        return None
+    try:
+        return json.loads(_json)
+    except ValueError:
+        return None